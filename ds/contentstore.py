@@ -0,0 +1,161 @@
+import hashlib
+import os
+import re
+import time
+import zlib
+
+COMPRESS_LEVEL = 6
+POINTER_PREFIX = "goon-blob:"
+KEY_RE = re.compile("[0-9a-f]{64}")
+# A note file is only a pointer if it holds exactly this; the newline may be "\r\n" on Windows
+POINTER_RE = re.compile(POINTER_PREFIX + "([0-9a-f]{64})\r?\n")
+POINTER_MAX_BYTES = len(POINTER_PREFIX) + 66
+# A blob is written just before the pointer to it, so recent ones may not be referenced yet
+GARBAGE_MIN_AGE_NS = 60 * 10**9
+
+
+def blob_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def pack(data):
+    return zlib.compress(data, COMPRESS_LEVEL)
+
+
+def unpack(blob):
+    try:
+        return zlib.decompress(blob)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt note blob: {e}")
+
+
+class ContentStore:
+    """Content-addressed note texts on disk: sha256 of the text -> zlib-compressed file.
+
+    Blobs live under `path` as ab/cdef..., so identical texts (copies,
+    templates) are stored once. A note file that uses the store holds only
+    a pointer line, see make_pointer() and read_note_file(). Every save of a
+    changed note adds a blob, so collect_garbage() deletes the ones no note
+    points to any more.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def put(self, text):
+        data = text.encode("utf-8")
+        key = blob_key(data)
+        blob_path = self._blob_path(key)
+        if os.path.exists(blob_path):
+            try:
+                # A fresh mtime keeps a running collect_garbage() away from it
+                os.utime(blob_path)
+                return key
+            except FileNotFoundError:
+                pass
+
+        folder = os.path.dirname(blob_path)
+        new_folder = not os.path.isdir(folder)
+        os.makedirs(folder, exist_ok=True)
+        temp_path = blob_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(pack(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, blob_path)
+        # The pointer is written right after this, so the blob has to be on disk first
+        _fsync_dir(folder)
+        if new_folder:
+            _fsync_dir(self.path)
+        return key
+
+    def pointer_for(self, text):
+        """Store `text` and return the pointer line a note file holds instead."""
+        return make_pointer(self.put(text))
+
+    def get(self, key):
+        with open(self._blob_path(key), "rb") as f:
+            return unpack(f.read()).decode("utf-8")
+
+    def collect_garbage(self, folder):
+        """Delete blobs that no note file under `folder` points to and return how many went.
+
+        Blobs written or reused shortly before or during the sweep are kept,
+        since a save may be about to point at them.
+        """
+        cutoff = time.time_ns() - GARBAGE_MIN_AGE_NS
+        referenced = set()
+        for dirpath, dirnames, filenames in os.walk(folder):
+            # The store itself lives in a hidden cache folder
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            for name in filenames:
+                if name.endswith('.goon'):
+                    key = read_pointer(os.path.join(dirpath, name))
+                    if key:
+                        referenced.add(key)
+
+        removed = 0
+        for prefix in _listdir(self.path):
+            for name in _listdir(os.path.join(self.path, prefix)):
+                blob_path = os.path.join(self.path, prefix, name)
+                if prefix + name in referenced:
+                    continue
+                try:
+                    if os.stat(blob_path).st_mtime_ns < cutoff:
+                        os.remove(blob_path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def _blob_path(self, key):
+        # Keys come from note files, so anything but a sha256 digest could point outside the store
+        if not KEY_RE.fullmatch(key):
+            raise ValueError(f"Invalid note blob key: {key[:80]!r}")
+        return os.path.join(self.path, key[:2], key[2:])
+
+
+def _listdir(path):
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+def _fsync_dir(path):
+    # Directories can only be opened for fsync on POSIX
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def make_pointer(key):
+    return POINTER_PREFIX + key + "\n"
+
+
+def read_pointer(path):
+    """The blob key a note file points to, or None if it holds plain text."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(POINTER_MAX_BYTES + 1)
+    except OSError:
+        return None
+    match = POINTER_RE.fullmatch(head.decode("utf-8", "replace"))
+    return match.group(1) if match else None
+
+
+def read_note_file(path, store=None):
+    """Text of the note at `path`, following a store pointer if it holds one."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if store and text.startswith(POINTER_PREFIX):
+        match = POINTER_RE.fullmatch(text)
+        if match:
+            return store.get(match.group(1))
+    return text
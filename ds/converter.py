@@ -1,44 +1,656 @@
 import json
+import mmap
+import os
+import re
+import struct
+import threading
+from json.decoder import scanstring
+from ds.contentstore import blob_key, pack, unpack
 from ds.treenode import TreeNode
 
+READ_CHUNK = 64 * 1024
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+BINARY_MAGIC = b"GOONBIN1"
+BINARY_VERSION = 2
+# Magic, then the byte length of the JSON header that follows it
+BINARY_PREFIX = struct.Struct("<8sQ")
+JOURNAL_MAGIC = b"GJR1"
+# Magic, then the lengths of the record's JSON metadata and of its body
+JOURNAL_RECORD = struct.Struct("<4sII")
+COMPACT_MIN_BYTES = 1024 * 1024
+SCALAR_END = tuple(' \t\n\r,:]}')
+LITERAL = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?|true|false|null")
+
 def load_my_file(path):
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
     return data
 def dict_to_tree(data, parent=None):
-    node = TreeNode(
-        name=data["name"],
-        is_folder=data["is_folder"],
-        content=data.get("content", ""),
-        parent=parent
-    )
+    root = None
+    stack = [(data, parent)]
+    while stack:
+        node_data, node_parent = stack.pop()
+        node = TreeNode(
+            name=node_data["name"],
+            is_folder=node_data["is_folder"],
+            content=node_data.get("content", ""),
+            parent=node_parent
+        )
+        node.uid = node_data.get("uid")
+        if node_parent is not None:
+            node_parent.add_child(node)
+        if root is None:
+            root = node
+        # Pushed in reverse so children come off the stack, and get added, in order
+        for child_data in reversed(node_data.get("children", [])):
+            stack.append((child_data, node))
+
+    return root
+
+class _Tokenizer:
+    """Pulls JSON tokens off a text stream a chunk at a time.
+
+    next() returns (kind, value): kind is one of '{}[]:,' for punctuation,
+    's' for a string or 'v' for any other scalar. Only the text from the
+    current token on is kept, so memory follows the largest single token
+    rather than the file.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        # Read at least as much as is buffered, so re-scanning a long token stays linear
+        data = self.stream.read(max(READ_CHUNK, len(self.buffer) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def next(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                break
+            if not self._fill():
+                raise ValueError("Unexpected end of .goon file")
+
+        char = self.buffer[self.pos]
+        if char in '{}[]:,':
+            self.pos += 1
+            return char, None
 
-    for child_data in data.get("children", []):
-        child = dict_to_tree(child_data, parent=node)
-        node.add_child(child)
+        if char == '"':
+            while True:
+                try:
+                    value, end = scanstring(self.buffer, self.pos + 1)
+                    self.pos = end
+                    return 's', value
+                except json.JSONDecodeError:
+                    # Most likely the string runs past the buffer
+                    if not self._fill():
+                        raise
 
-    return node
+        while True:
+            match = LITERAL.match(self.buffer, self.pos)
+            # "1." at the end of the buffer may be the start of "1.5", so a match only
+            # counts once something that can follow a scalar comes after it
+            if match and (self.eof or self.buffer[match.end():match.end() + 1] in SCALAR_END):
+                self.pos = match.end()
+                return 'v', json.loads(match.group())
+            if not self._fill() and not match:
+                raise ValueError(f"Unexpected character {char!r} in .goon file")
+
+    def expect(self, kind):
+        token = self.next()
+        if token[0] != kind:
+            raise ValueError(f"Expected {kind!r} in .goon file, got {token[0]!r}")
+        return token[1]
+
+    def skip_value(self, token):
+        depth = 1 if token[0] in '{[' else 0
+        while depth:
+            kind = self.next()[0]
+            if kind in '{[':
+                depth += 1
+            elif kind in '}]':
+                depth -= 1
+
+def parse_tree(stream):
+    """Build the TreeNodes of a .goon document as it is read, without recursion."""
+    tokens = _Tokenizer(stream)
+    tokens.expect('{')
+    root = TreeNode("", is_folder=True)
+    # Nodes whose object is still open; each one below the top is in its parent's children list
+    stack = [root]
+    while stack:
+        node = stack[-1]
+        kind, value = tokens.next()
+        if kind == ',':
+            continue
+
+        if kind == '}':
+            stack.pop()
+            if stack:
+                kind = tokens.next()[0]
+                if kind == ',':
+                    tokens.expect('{')
+                    stack.append(_add_parsed_child(stack[-1]))
+                elif kind != ']':
+                    raise ValueError("Expected ',' or ']' after a child in .goon file")
+            continue
+
+        if kind != 's':
+            raise ValueError("Expected a key in .goon file")
+        tokens.expect(':')
+        if value == "children":
+            tokens.expect('[')
+            kind = tokens.next()[0]
+            if kind == '{':
+                stack.append(_add_parsed_child(node))
+            elif kind != ']':
+                raise ValueError("Expected a child or ']' in .goon file")
+        elif value == "name":
+            node.name = tokens.expect('s')
+        elif value == "content":
+            node.content = tokens.expect('s')
+        elif value == "is_folder":
+            node.is_folder = bool(tokens.expect('v'))
+        elif value == "uid":
+            node.uid = tokens.expect('s')
+        else:
+            tokens.skip_value(tokens.next())
+
+    return root
+
+def _add_parsed_child(parent):
+    child = TreeNode("", is_folder=True)
+    parent.add_child(child)
+    return child
 
 def load_tree_from_my(path):
-    data = load_my_file(path)
-    return dict_to_tree(data)
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_tree(f)
 
     
 def tree_to_dict(node):
-    return {
-        "name": node.name,
-        "is_folder": node.is_folder,
-        "content": node.content,
-        "children": [tree_to_dict(c) for c in node.children]
-    }
+    root = None
+    stack = [(node, None)]
+    while stack:
+        current, siblings = stack.pop()
+        data = {
+            "name": current.name,
+            "is_folder": current.is_folder,
+            "content": current.content,
+            "children": []
+        }
+        if current.uid:
+            data["uid"] = current.uid
+        if siblings is None:
+            root = data
+        else:
+            siblings.append(data)
+        # Pushed in reverse so children come off the stack, and get appended, in order
+        for child in reversed(list(current.children)):
+            stack.append((child, data["children"]))
+    return root
+
 def save_my_file(path, data):
     with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+        f.writelines(_iter_json(data))
+
+def _iter_json(data, indent=4):
+    """The text of json.dump(data, indent=indent) in pieces, without recursing into nested values."""
+    # [items of an open container, its closing bracket, whether it is a dict, items written]
+    stack = []
+    value = data
+    while True:
+        if isinstance(value, dict) and value:
+            yield "{"
+            stack.append([iter(value.items()), "}", True, 0])
+        elif isinstance(value, list) and value:
+            yield "["
+            stack.append([iter(value), "]", False, 0])
+        else:
+            yield json.dumps(value)
+
+        while stack:
+            frame = stack[-1]
+            item = next(frame[0], _END)
+            if item is _END:
+                stack.pop()
+                yield "\n" + " " * (indent * len(stack)) + frame[1]
+                continue
+            yield ("," if frame[3] else "") + "\n" + " " * (indent * len(stack))
+            frame[3] += 1
+            if frame[2]:
+                yield json.dumps(item[0]) + ": "
+                value = item[1]
+            else:
+                value = item
+            break
+        else:
+            return
+
+_END = object()
         
 def save_tree_to_my(path, root_node):
     data = tree_to_dict(root_node)
     save_my_file(path, data)
-    
+
+
+def is_binary_file(path):
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+def snapshot_tree(root_node):
+    """(node, name, is_folder, child_count, content, uid) for every node in preorder."""
+    order = []
+    stack = [root_node]
+    while stack:
+        node = stack.pop()
+        children = list(node.children)
+        order.append((node, node.name, node.is_folder, len(children), node.content, node.uid))
+        stack.extend(reversed(children))
+    return order
+
+def write_binary(path, snapshot, source=None):
+    """Write a snapshot_tree() as a binary .goon container and return each node's body span.
+
+    Layout: BINARY_PREFIX, a JSON header listing every node in preorder as
+    [name, is_folder, child_count, offset, length, key, uid], then the bodies.
+    Bodies are zlib blobs named by the sha256 `key` of their UTF-8 text and
+    stored once however many notes share them; offsets count from the
+    start of the file. Nodes whose content is None have not been read yet
+    and are copied over from `source`, a BinaryProject. A span is
+    (offset, length, key, packed).
+    """
+    entries = []
+    blobs = {}
+    owners = {}
+    for node, name, is_folder, child_count, content, uid in snapshot:
+        entry = [name, is_folder, child_count, 0, 0, "", uid]
+        entries.append(entry)
+        blob = None
+        if content is None and source.bodies[node][3]:
+            # Already packed: copy the blob across without unpacking it
+            _, length, key, _ = source.bodies[node]
+            blob = node
+        else:
+            data = source.read_data(node) if content is None else content.encode("utf-8")
+            if not data:
+                continue
+            key = blob_key(data)
+        entry[5] = key
+
+        if key not in owners:
+            owners[key] = entry
+            if blob is None:
+                blob = pack(data)
+                length = len(blob)
+            blobs[key] = blob
+            entry[4] = length
+
+    # Offsets depend on the header's size, and the header holds the offsets
+    start = 0
+    while True:
+        offset = start
+        for key, owner in owners.items():
+            owner[3] = offset
+            offset += owner[4]
+        for entry in entries:
+            if entry[5] and owners[entry[5]] is not entry:
+                entry[3], entry[4] = owners[entry[5]][3], owners[entry[5]][4]
+        header = json.dumps({"version": BINARY_VERSION, "nodes": entries}, separators=(",", ":")).encode("utf-8")
+        if BINARY_PREFIX.size + len(header) == start:
+            break
+        start = BINARY_PREFIX.size + len(header)
+
+    with open(path, "wb") as f:
+        f.write(BINARY_PREFIX.pack(BINARY_MAGIC, len(header)))
+        f.write(header)
+        for key in owners:
+            blob = blobs[key]
+            f.write(blob if isinstance(blob, bytes) else source.read_body(blob))
+        f.flush()
+        os.fsync(f.fileno())
+    return [(entry[3], entry[4], entry[5] or None, True) for entry in entries]
+
+def save_tree_to_binary(path, root_node):
+    temp_path = path + ".tmp"
+    write_binary(temp_path, snapshot_tree(root_node))
+    os.replace(temp_path, path)
+
+class BinaryProject:
+    """A binary .goon container opened for on-demand reading and journaled saving.
+
+    open() builds the tree from the header alone and leaves every non-empty
+    note's content as None; read_content() pulls a body out of the
+    memory-mapped file the first time it is needed. Version 1 files, whose
+    bodies are stored as plain UTF-8, are read the same way and upgraded by
+    the first compaction.
+
+    Nodes get an id (their preorder index when the file was written, or the
+    next free one). save() appends the nodes passed to mark_dirty() and
+    mark_removed() since the last save as journal records after the bodies,
+    closed by a commit record, so a save costs the size of the edit. Once
+    the journal outgrows the base, a background thread writes a fresh
+    container, which the next save() swaps in. A journaled note whose text
+    is already stored somewhere in the file refers to that blob instead of
+    writing it again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+        self.bodies = {}
+        # key -> (offset, length) of a packed blob somewhere in the file
+        self.blobs = {}
+        self.ids = {}
+        self.next_id = 0
+        self.base_bytes = 0
+        self.journal_bytes = 0
+        self.dirty = {}
+        self.removed = []
+        self.lock = threading.RLock()
+        self.compactor = None
+        self.compacted = None
+        # Changes saved while the compactor runs, replayed onto its output
+        self.dirty_since = {}
+        self.removed_since = []
+
+    def open(self):
+        self._map()
+        magic, header_length = BINARY_PREFIX.unpack_from(self.map, 0)
+        if magic != BINARY_MAGIC:
+            self.close()
+            raise ValueError("Not a binary .goon file")
+        header = json.loads(self.map[BINARY_PREFIX.size:BINARY_PREFIX.size + header_length])
+        version = header.get("version")
+        if version not in (1, BINARY_VERSION):
+            self.close()
+            raise ValueError(f"Unsupported .goon version: {header.get('version')}")
+
+        root = None
+        nodes = {}
+        # [node, children still to come] for every node with pending children
+        pending = []
+        self.bodies = {}
+        self.blobs = {}
+        base_end = BINARY_PREFIX.size + header_length
+        for name, is_folder, child_count, offset, length, *extra in header["nodes"]:
+            node = TreeNode(name, is_folder=is_folder, content=None if length else "")
+            # Version 2 adds the blob key, then the node's uid
+            key = extra[:1]
+            node.uid = extra[1] if len(extra) > 1 else None
+            nodes[len(nodes)] = node
+            if length:
+                if version == 1:
+                    self.bodies[node] = (offset, length, None, False)
+                else:
+                    self.bodies[node] = (offset, length, key[0], True)
+                    self.blobs[key[0]] = (offset, length)
+                base_end = max(base_end, offset + length)
+            if root is None:
+                root = node
+            else:
+                while pending[-1][1] == 0:
+                    pending.pop()
+                pending[-1][1] -= 1
+                pending[-1][0].add_child(node)
+            if child_count:
+                pending.append([node, child_count])
+
+        end = self._replay(nodes, base_end)
+        if end < len(self.map):
+            # Drop a torn tail so the next append starts on a record boundary
+            self.close()
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+            self._map()
+        self.ids = {node: node_id for node_id, node in nodes.items()}
+        self.next_id = max(nodes) + 1
+        self.base_bytes = base_end
+        self.journal_bytes = end - base_end
+        return root
+
+    def read_content(self, node):
+        if node.content is None:
+            node.content = self.read_data(node).decode("utf-8")
+        return node.content
+
+    def read_data(self, node):
+        """The UTF-8 text of `node` as stored in the file."""
+        body = self.read_body(node)
+        return unpack(body) if self.bodies[node][3] else body
+
+    def read_body(self, node):
+        """The raw bytes stored for `node`, still packed if the file packs them."""
+        with self.lock:
+            if not self.map:
+                raise ValueError("Project file is closed")
+            offset, length, _, _ = self.bodies[node]
+            return self.map[offset:offset + length]
+
+    def mark_dirty(self, node):
+        """Record that `node` was added, renamed or given new content."""
+        self.dirty[node] = None
+
+    def mark_removed(self, node):
+        self.dirty.pop(node, None)
+        self.removed.append(node)
+
+    def save(self, root_node):
+        if self.compacted:
+            self._finish_compaction(root_node)
+
+        records = self._records(root_node, self.dirty, self.removed)
+        if records:
+            self._append(records)
+
+        if self.compactor:
+            self.dirty_since.update(self.dirty)
+            self.removed_since.extend(self.removed)
+        self.dirty = {}
+        self.removed = []
+
+        if not self.compactor and self.journal_bytes > max(COMPACT_MIN_BYTES, self.base_bytes):
+            self._start_compaction(root_node)
+
+    def _records(self, root_node, dirty, removed):
+        """Journal records, closed by a commit, for the given changes; [] if there are none."""
+        records = []
+        for node in removed:
+            if node in self.ids:
+                records.append(({"op": "remove", "id": self.ids.pop(node)}, b""))
+        for node in dirty:
+            # Skip nodes added and then deleted again, or under a deleted folder
+            if not _is_attached(node, root_node):
+                continue
+            if node not in self.ids:
+                self.ids[node] = self.next_id
+                self.next_id += 1
+            meta = {"op": "put", "id": self.ids[node], "name": node.name, "is_folder": node.is_folder,
+                    "parent": self.ids.get(node.parent)}
+            if node.uid:
+                meta["uid"] = node.uid
+            if node.content is None:
+                # Renamed without being read: the stored body stays
+                meta["keep"] = True
+                records.append((meta, b""))
+                continue
+
+            data = node.content.encode("utf-8")
+            if not data:
+                records.append((meta, b""))
+                continue
+            meta["key"] = blob_key(data)
+            if meta["key"] in self.blobs:
+                meta["ref"] = list(self.blobs[meta["key"]])
+                records.append((meta, b""))
+            else:
+                meta["packed"] = True
+                records.append((meta, pack(data)))
+
+        if records:
+            records.append(({"op": "commit"}, b""))
+        return records
+
+    def close(self):
+        if self.compacted:
+            os.remove(self.compacted[0])
+            self.compacted = None
+        with self.lock:
+            if self.map:
+                self.map.close()
+                self.map = None
+            if self.file:
+                self.file.close()
+                self.file = None
+
+    def _map(self):
+        self.file = open(self.path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _append(self, records, path=None):
+        with open(path or self.path, "ab") as f:
+            offset = f.tell()
+            for meta, body in records:
+                encoded = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+                f.write(JOURNAL_RECORD.pack(JOURNAL_MAGIC, len(encoded), len(body)))
+                f.write(encoded)
+                f.write(body)
+                if meta.get("packed"):
+                    # Later saves of the same text can point here
+                    self.blobs.setdefault(meta["key"], (offset + JOURNAL_RECORD.size + len(encoded), len(body)))
+                offset += JOURNAL_RECORD.size + len(encoded) + len(body)
+                self.journal_bytes += JOURNAL_RECORD.size + len(encoded) + len(body)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay(self, nodes, offset):
+        """Apply the committed journal records from `offset` on and return where they end."""
+        end = offset
+        batch = []
+        while offset + JOURNAL_RECORD.size <= len(self.map):
+            magic, meta_length, body_length = JOURNAL_RECORD.unpack_from(self.map, offset)
+            body_start = offset + JOURNAL_RECORD.size + meta_length
+            if magic != JOURNAL_MAGIC or body_start + body_length > len(self.map):
+                break
+            try:
+                meta = json.loads(self.map[offset + JOURNAL_RECORD.size:body_start])
+            except ValueError:
+                break
+            offset = body_start + body_length
+            if meta["op"] == "commit":
+                for meta, span in batch:
+                    self._apply_record(nodes, meta, span)
+                batch = []
+                end = offset
+            else:
+                batch.append((meta, (body_start, body_length)))
+        return end
+
+    def _apply_record(self, nodes, meta, span):
+        node = nodes.get(meta["id"])
+        if meta["op"] == "remove":
+            nodes.pop(meta["id"], None)
+            if node and node.parent:
+                node.parent.remove_child(node)
+            return
+
+        parent = nodes.get(meta["parent"])
+        if node is None:
+            if parent is None:
+                return
+            node = TreeNode(meta["name"], is_folder=meta["is_folder"])
+            nodes[meta["id"]] = node
+            parent.add_child(node)
+        else:
+            if node.name != meta["name"]:
+                node.name = meta["name"]
+            node.is_folder = meta["is_folder"]
+            if parent is not None and node.parent is not parent:
+                node.parent.remove_child(node)
+                parent.add_child(node)
+        if "uid" in meta:
+            node.uid = meta["uid"]
+
+        if not meta.get("keep"):
+            if "ref" in meta:
+                span = tuple(meta["ref"])
+            if span[1]:
+                node.content = None
+                self.bodies[node] = (span[0], span[1], meta.get("key"), "key" in meta)
+                if "key" in meta:
+                    self.blobs.setdefault(meta["key"], span)
+            else:
+                node.content = ""
+                self.bodies.pop(node, None)
+
+    def _start_compaction(self, root_node):
+        snapshot = snapshot_tree(root_node)
+        temp_path = self.path + ".compact"
+        self.dirty_since = {}
+        self.removed_since = []
+        self.compactor = threading.Thread(target=self._compact, args=(snapshot, temp_path), daemon=True)
+        self.compactor.start()
+
+    def _compact(self, snapshot, temp_path):
+        try:
+            spans = write_binary(temp_path, snapshot, self)
+        except (OSError, ValueError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            self.compactor = None
+            return
+        self.compacted = (temp_path, snapshot, spans)
+
+    def _finish_compaction(self, root_node):
+        temp_path, snapshot, spans = self.compacted
+        self.compacted = None
+        self.compactor = None
+        with self.lock:
+            old_state = (self.bodies, self.blobs, self.ids, self.next_id, self.base_bytes, self.journal_bytes)
+            self.bodies = {node: span for (node, *_), span in zip(snapshot, spans) if node.content is None}
+            self.blobs = {key: (offset, length) for offset, length, key, _ in spans if length}
+            self.ids = {node: node_id for node_id, (node, *_) in enumerate(snapshot)}
+            self.next_id = len(snapshot)
+            self.base_bytes = os.path.getsize(temp_path)
+            self.journal_bytes = 0
+            try:
+                # Saves made since the snapshot are already committed in the old file, so
+                # they go into the new one's journal before it takes the old one's place
+                records = self._records(root_node, self.dirty_since, self.removed_since)
+                if records:
+                    self._append(records, temp_path)
+            except OSError:
+                # Keep the old file; a later save starts another compaction
+                self.bodies, self.blobs, self.ids, self.next_id, self.base_bytes, self.journal_bytes = old_state
+                os.remove(temp_path)
+                return
+            finally:
+                self.dirty_since = {}
+                self.removed_since = []
+
+            # The old file stays mapped until every unread body has been copied out of it
+            self.close()
+            os.replace(temp_path, self.path)
+            self._map()
+
+def _is_attached(node, root_node):
+    while node is not root_node:
+        if node.parent is None or node not in node.parent.children:
+            return False
+        node = node.parent
+    return True
+
     
 # root = load_tree_from_my("test.goon")
 # print(root.content)
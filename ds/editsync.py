@@ -0,0 +1,185 @@
+import re
+import tkinter as tk
+
+# Stands in for the widget's command. Indices are resolved before the real command
+# runs, and Python only hears about an edit after the widget has accepted it, so a
+# rejected call stays an ordinary Tcl error that Tk's own bindings can catch.
+PROXY = """
+proc {%(widget)s} {command args} {
+    switch -- $command {
+        insert {set count 1}
+        delete {set count [llength $args]}
+        replace {set count 2}
+        default {return [{%(orig)s} $command {*}$args]}
+    }
+    if {[llength $args] < $count || [catch {
+        set end [{%(orig)s} index end]
+        set names [lrange $args 0 [expr {$count - 1}]]
+        if {$command eq "delete" && $count == 1} {
+            # A single index deletes one character, however many units Tk gives it
+            lappend names [%(next)s]
+        }
+        set indices {}
+        foreach index $names {
+            set index [{%(orig)s} index $index]
+            lappend indices $index [if {$%(astral)s} {%(prefix)s}]
+        }
+    }]} {
+        return [{%(orig)s} $command {*}$args]
+    }
+    set result [{%(orig)s} $command {*}$args]
+    {%(callback)s} $command [llength $names] $end {*}$indices {*}[lrange $args $count end]
+    return $result
+}
+"""
+# Text up to the index on its own line; Python counts its code points itself,
+# since Tcl 8.6 counts a character outside the BMP as two. Only sent while the
+# text holds such characters, otherwise the index alone gives the offset.
+TEXT_PREFIX = "{%(orig)s} get \"[lindex [split $index .] 0].0\" $index"
+ENTRY_PREFIX = "string range [{%(orig)s} get] 0 [expr {$index - 1}]"
+TEXT_NEXT = "string cat [lindex $names 0] { +1c}"
+ENTRY_NEXT = "expr {[{%(orig)s} index [lindex $names 0]] + 1}"
+# What half of a split surrogate pair looks like once it reaches Python
+SURROGATE = re.compile("[\ud800-\udfff]")
+ASTRAL = re.compile("[\U00010000-\U0010ffff]")
+
+
+def _common_prefix(a, b):
+    # Binary search over slice comparisons, which run in C
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class EditSync:
+    """Mirror the insert/delete calls of a Tk Text or Entry widget into a TextBuffer.
+
+    The widget's Tcl command is renamed and replaced by a proxy, so every edit
+    (typing, paste, programmatic changes) reaches the buffer as a range edit
+    at its offset instead of the whole text being re-read. Edits whose range
+    Tk adjusts itself (deleting up to "end" also takes the newline before a
+    line start) are picked up by diffing against the widget instead.
+    """
+
+    def __init__(self, widget, buffer, on_edit=None):
+        self.widget = widget
+        self.on_edit = on_edit
+        self.is_text = isinstance(widget, tk.Text)
+        self._orig = widget._w + "_orig"
+        self._callback = widget.register(self._edited)
+        # Tcl flag asking the proxy to send line prefixes
+        self._astral_var = f"::editsync_astral({widget._w})"
+        # Each code point outside the BMP takes this many index units in Tk
+        self.astral_units = int(widget.tk.call("string", "length", "\U0001F600"))
+        self.has_astral = False
+        self.buffer = buffer
+        names = {'widget': widget._w, 'orig': self._orig, 'callback': self._callback,
+                 'astral': "{" + self._astral_var + "}"}
+        names['prefix'] = (TEXT_PREFIX if self.is_text else ENTRY_PREFIX) % names
+        names['next'] = (TEXT_NEXT if self.is_text else ENTRY_NEXT) % names
+        widget.tk.call("rename", widget._w, self._orig)
+        widget.tk.eval(PROXY % names)
+
+    @property
+    def buffer(self):
+        return self._buffer
+
+    @buffer.setter
+    def buffer(self, buffer):
+        self._buffer = buffer
+        self._set_astral(buffer.get_text_length() > 0 and bool(ASTRAL.search(buffer.get_text())))
+
+    def _set_astral(self, value):
+        # Offsets from plain Tk indices are only off when Tk counts these characters twice
+        value = value and self.astral_units > 1
+        if value != self.has_astral or not self.widget.tk.call("info", "exists", self._astral_var):
+            self.has_astral = value
+            self.widget.tk.call("set", self._astral_var, int(value))
+
+    def detach(self):
+        self.widget.tk.call("rename", self.widget._w, "")
+        self.widget.tk.call("rename", self._orig, self.widget._w)
+        self.widget.deletecommand(self._callback)
+        self.widget.tk.call("unset", "-nocomplain", self._astral_var)
+
+    def _call(self, *args):
+        return self.widget.tk.call(self._orig, *args)
+
+    def index(self, offset):
+        """Tk index of buffer `offset`, for a Text widget in sync with the buffer."""
+        line, column = self.buffer.offset_to_line_col(offset)
+        if self.has_astral:
+            text = str(self._call("get", f"{line}.0", f"{line}.end"))[:column]
+            column += sum(1 for char in text if char > "\uffff") * (self.astral_units - 1)
+        return f"{line}.{column}"
+
+    def _offset(self, index, prefix):
+        if self.is_text:
+            line, column = map(int, index.split("."))
+            if self.has_astral:
+                column = len(prefix)
+            return min(self.buffer.line_start(line) + column, self.buffer.get_text_length())
+        return min(len(prefix) if self.has_astral else int(index), self.buffer.get_text_length())
+
+    def _notify(self, offset, removed, inserted):
+        if self.on_edit and (removed or inserted):
+            self.on_edit(offset, removed, inserted)
+
+    def _edited(self, command, count, end, *args):
+        # Called from Tcl: an exception here would surface in mainloop() and close the app
+        try:
+            self._apply(command, int(count), end, args)
+        except Exception:
+            self.resync()
+
+    def _apply(self, command, count, end, args):
+        indices = args[:2 * count:2]
+        prefixes = args[1:2 * count:2]
+        args = args[2 * count:]
+        if any(SURROGATE.search(prefix) for prefix in prefixes):
+            # An index fell inside a character outside the BMP
+            self.resync()
+            return
+        offsets = [self._offset(index, prefix) for index, prefix in zip(indices, prefixes)]
+
+        if command == "insert":
+            text = "".join(args[::2]) if self.is_text else args[0]
+            if not self.has_astral and ASTRAL.search(text):
+                self._set_astral(True)
+            self.buffer.insert_text(text, offsets[0])
+            self._notify(offsets[0], "", text)
+            return
+
+        # Tk moves or trims these ranges itself; multiple ranges may also overlap
+        if self.is_text and (end in indices or len(offsets) > 2):
+            self.resync()
+            return
+
+        start, stop = offsets
+        if command == "delete":
+            if stop > start:
+                self._notify(start, self.buffer.delete_range(start, stop), "")
+            return
+
+        text = "".join(args[::2])
+        if not self.has_astral and ASTRAL.search(text):
+            self._set_astral(True)
+        self._notify(start, self.buffer.replace_range(start, max(start, stop), text), text)
+
+    def resync(self):
+        """Bring the buffer back in line with the widget, reporting the difference as one edit."""
+        old = self.buffer.get_text()
+        new = str(self._call("get", "1.0", "end-1c") if self.is_text else self._call("get"))
+        start = _common_prefix(old, new)
+        tail = _common_prefix(old[start:][::-1], new[start:][::-1])
+        removed_end = len(old) - tail
+        inserted = new[start:len(new) - tail]
+        if not self.has_astral and ASTRAL.search(inserted):
+            self._set_astral(True)
+        if removed_end > start or inserted:
+            self._notify(start, self.buffer.replace_range(start, removed_end, inserted), inserted)
@@ -1,97 +1,171 @@
-class GapBuffer:
+from array import array, typecodes
+
+from ds.lineindex import LineIndex
+from ds.textbuffer import TextBuffer
+
+# 'w' stores UCS-4 code points; 'u' is its deprecated predecessor on older Pythons,
+# but only as wide as wchar_t, so where that is two bytes (Windows) code points go in 'I'.
+if 'w' in typecodes or array('u').itemsize == 4:
+    TYPECODE = 'w' if 'w' in typecodes else 'u'
+    NEWLINE = '\n'
+
+    def _to_array(text):
+        return array(TYPECODE, text)
+
+    def _to_text(items):
+        return items.tounicode()
+else:
+    TYPECODE = 'I'
+    NEWLINE = ord('\n')
+
+    def _to_array(text):
+        return array(TYPECODE, map(ord, text))
+
+    def _to_text(items):
+        return ''.join(map(chr, items))
+
+
+def _blank(size):
+    return _to_array('\0' * size)
+
+
+class GapBuffer(TextBuffer):
     def __init__(self, initial_size=128):
-        self.buffer = [''] * initial_size
+        self.buffer = _blank(initial_size)
         self.gap_start = 0
         self.gap_end = initial_size
         self.cursor_position = 0
-    
+        self.lines = LineIndex()
+
     def insert(self, char):
         if self.gap_start == self.gap_end:
             self._expand_gap()
-        
-        self.buffer[self.gap_start] = char
+
+        self.buffer[self.gap_start] = _to_array(char)[0]
+        if char == '\n':
+            self.lines.insert(char, self.gap_start)
         self.gap_start += 1
         self.cursor_position += 1
-    
+
+    def insert_text(self, text, position=None):
+        if position is not None:
+            self.move_cursor(position)
+
+        count = len(text)
+        if self.gap_end - self.gap_start < count:
+            self._expand_gap(count)
+
+        self.buffer[self.gap_start:self.gap_start + count] = _to_array(text)
+        self.lines.insert(text, self.gap_start)
+        self.gap_start += count
+        self.cursor_position += count
+
+    def delete_range(self, start, end):
+        text_length = self.get_text_length()
+        start = max(0, min(start, text_length))
+        end = max(start, min(end, text_length))
+
+        self.move_cursor(start)
+        removed = _to_text(self.buffer[self.gap_end:self.gap_end + end - start])
+        self.gap_end += end - start
+        self.lines.remove_after(removed.count('\n'))
+        return removed
+
+    def replace_range(self, start, end, text):
+        removed = self.delete_range(start, end)
+        self.insert_text(text)
+        return removed
+
     def delete(self):
         if self.gap_start > 0:
             self.gap_start -= 1
-            self.buffer[self.gap_start] = ''
+            if self.buffer[self.gap_start] == NEWLINE:
+                self.lines.remove_before(1)
             self.cursor_position -= 1
             return True
         return False
-    
+
     def delete_forward(self):
         if self.gap_end < len(self.buffer):
-            self.buffer[self.gap_end] = ''
+            if self.buffer[self.gap_end] == NEWLINE:
+                self.lines.remove_after(1)
             self.gap_end += 1
             return True
         return False
-    
+
     def move_cursor(self, position):
         text_length = self.get_text_length()
         position = max(0, min(position, text_length))
-        
+        self.lines.move_gap(self.gap_start, position, text_length)
+
         if position < self.gap_start:
-            while position < self.gap_start:
-                self.gap_start -= 1
-                self.gap_end -= 1
-                self.buffer[self.gap_end] = self.buffer[self.gap_start]
-                self.buffer[self.gap_start] = ''
-        
+            count = self.gap_start - position
+            self.buffer[self.gap_end - count:self.gap_end] = self.buffer[position:self.gap_start]
+            self.gap_start = position
+            self.gap_end -= count
+
         elif position > self.gap_start:
-            while position > self.gap_start:
-                self.buffer[self.gap_start] = self.buffer[self.gap_end]
-                self.buffer[self.gap_end] = ''
-                self.gap_start += 1
-                self.gap_end += 1
-        
+            count = position - self.gap_start
+            self.buffer[self.gap_start:position] = self.buffer[self.gap_end:self.gap_end + count]
+            self.gap_start = position
+            self.gap_end += count
+
         self.cursor_position = position
-    
+
     def get_text(self):
-        return ''.join(self.buffer[:self.gap_start] + 
-                      self.buffer[self.gap_end:])
-    
+        return _to_text(self.buffer[:self.gap_start]) + _to_text(self.buffer[self.gap_end:])
+
     def get_text_length(self):
         return len(self.buffer) - (self.gap_end - self.gap_start)
-    
+
     def set_text(self, text):
-        needed_size = len(text) + 128
-        self.buffer = [''] * needed_size
+        self.buffer = _blank(128)
+        self.buffer.extend(_to_array(text))
         self.gap_start = 0
-        self.gap_end = needed_size
-        
-        for char in text:
-            self.insert(char)
-        
-        self.move_cursor(0)
-    
+        self.gap_end = 128
+        self.cursor_position = 0
+        self.lines.set_text(text)
+
     def clear(self):
         initial_size = 128
-        self.buffer = [''] * initial_size
+        self.buffer = _blank(initial_size)
         self.gap_start = 0
         self.gap_end = initial_size
         self.cursor_position = 0
-    
-    def _expand_gap(self):
+        self.lines = LineIndex()
+
+    def _expand_gap(self, min_gap=1):
         old_size = len(self.buffer)
-        new_size = old_size * 2
-        
-        new_buffer = [''] * new_size
-        
-        for i in range(self.gap_start):
-            new_buffer[i] = self.buffer[i]
-        
-        new_gap_end = new_size - (old_size - self.gap_end)
-        
-        j = new_gap_end
-        for i in range(self.gap_end, old_size):
-            new_buffer[j] = self.buffer[i]
-            j += 1
-        
-        self.buffer = new_buffer
-        self.gap_end = new_gap_end
-    
+        gap_size = self.gap_end - self.gap_start
+        new_size = max(old_size * 2, old_size - gap_size + min_gap)
+
+        # Splicing blanks in at gap_end shifts the tail in one memmove
+        self.buffer[self.gap_end:self.gap_end] = _blank(new_size - old_size)
+        self.gap_end += new_size - old_size
+
+    def snapshot(self):
+        copy = GapBuffer(0)
+        copy.buffer = array(TYPECODE, self.buffer)
+        copy.gap_start = self.gap_start
+        copy.gap_end = self.gap_end
+        copy.cursor_position = self.cursor_position
+        copy.lines = self.lines.copy()
+        return copy
+
+    def line_count(self):
+        return self.lines.line_count()
+
+    def line_start(self, line):
+        return self.lines.line_start(line, self.get_text_length())
+
+    def line_of(self, offset):
+        return self.lines.line_of(offset, self.get_text_length())
+
+    def get_info(self):
+        info = super().get_info()
+        info.update(self.get_gap_info())
+        return info
+
     def get_gap_info(self):
         return {
             'buffer_size': len(self.buffer),
@@ -101,7 +175,7 @@ class GapBuffer:
             'text_length': self.get_text_length(),
             'cursor_position': self.cursor_position
         }
-    
+
     def __str__(self):
         info = self.get_gap_info()
         text = self.get_text()
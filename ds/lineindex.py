@@ -0,0 +1,183 @@
+from array import array
+from bisect import bisect_left
+
+BLOCK_SIZE = 512
+
+
+class LineIndex:
+    """Newline positions of a GapBuffer, split at the gap like the text itself.
+
+    Newlines are kept in blocks of up to BLOCK_SIZE offsets, ascending and
+    relative to the block's base. `before` holds the blocks in front of the
+    gap in text order, with absolute bases. `after` holds the blocks behind
+    the gap with the one nearest the gap last, and their bases as distances
+    from the end of the text, so edits at the gap never renumber them.
+    Moving the gap rebases whole blocks and splits at most one, so its cost
+    follows the number of blocks passed rather than the newlines in them.
+    """
+
+    def __init__(self):
+        self.before = []
+        self.after = []
+        self.before_count = 0
+        self.after_count = 0
+
+    def set_text(self, text):
+        # GapBuffer.set_text leaves the gap at offset 0, so every newline is behind it
+        length = len(text)
+        positions = _newlines(text)
+        self.before = []
+        self.after = []
+        for i in range(0, len(positions), BLOCK_SIZE):
+            base = positions[i]
+            self.after.append([length - base, array('q', [p - base for p in positions[i:i + BLOCK_SIZE]])])
+        self.after.reverse()
+        self.before_count = 0
+        self.after_count = len(positions)
+
+    def copy(self):
+        index = LineIndex()
+        index.before = [[base, array('q', offsets)] for base, offsets in self.before]
+        index.after = [[end_base, array('q', offsets)] for end_base, offsets in self.after]
+        index.before_count = self.before_count
+        index.after_count = self.after_count
+        return index
+
+    def move_gap(self, gap_start, position, length):
+        if position < gap_start:
+            # Newlines at or past `position` end up behind the gap
+            while self.before:
+                base, offsets = self.before[-1]
+                k = bisect_left(offsets, position - base)
+                if k == len(offsets):
+                    break
+                if k:
+                    self.before[-1][1] = offsets[:k]
+                    offsets = offsets[k:]
+                else:
+                    self.before.pop()
+                self.before_count -= len(offsets)
+                self.after_count += len(offsets)
+                self._push_after(length - base, offsets)
+                if k:
+                    break
+
+        elif position > gap_start:
+            while self.after:
+                end_base, offsets = self.after[-1]
+                base = length - end_base
+                k = bisect_left(offsets, position - base)
+                if k == 0:
+                    break
+                split = k < len(offsets)
+                if split:
+                    self.after[-1][1] = offsets[k:]
+                    offsets = offsets[:k]
+                else:
+                    self.after.pop()
+                self.after_count -= len(offsets)
+                self.before_count += len(offsets)
+                self._push_before(base, offsets)
+                if split:
+                    break
+
+    def _push_before(self, base, offsets):
+        # Fold into the last block when both fit, so repeated splits don't pile up
+        if self.before and len(self.before[-1][1]) + len(offsets) <= BLOCK_SIZE:
+            last_base, last = self.before[-1]
+            shift = base - last_base
+            last.extend(shift + p for p in offsets)
+        else:
+            self.before.append([base, offsets])
+
+    def _push_after(self, end_base, offsets):
+        if self.after and len(self.after[-1][1]) + len(offsets) <= BLOCK_SIZE:
+            top_end_base, top = self.after[-1]
+            shift = end_base - top_end_base
+            offsets = array('q', offsets)
+            offsets.extend(shift + p for p in top)
+            self.after[-1] = [end_base, offsets]
+        else:
+            self.after.append([end_base, offsets])
+
+    def insert(self, text, position):
+        positions = _newlines(text, 0, position)
+        self.before_count += len(positions)
+        for p in positions:
+            if not self.before or len(self.before[-1][1]) >= BLOCK_SIZE:
+                self.before.append([p, array('q')])
+            base, offsets = self.before[-1]
+            offsets.append(p - base)
+
+    def remove_before(self, count):
+        self.before_count -= count
+        while count:
+            offsets = self.before[-1][1]
+            n = min(count, len(offsets))
+            del offsets[len(offsets) - n:]
+            count -= n
+            if not offsets:
+                self.before.pop()
+
+    def remove_after(self, count):
+        # The newlines nearest the gap are at the front of the last block
+        self.after_count -= count
+        while count:
+            offsets = self.after[-1][1]
+            n = min(count, len(offsets))
+            del offsets[:n]
+            count -= n
+            if not offsets:
+                self.after.pop()
+
+    def line_count(self):
+        return self.before_count + self.after_count + 1
+
+    def line_start(self, line, length):
+        """Offset of the first character of 1-based `line`."""
+        if line <= 1:
+            return 0
+        if line > self.line_count():
+            return length
+
+        # Walk out from the gap, where edits and the cursor usually are
+        i = line - 2
+        if i < self.before_count:
+            n = self.before_count
+            for base, offsets in reversed(self.before):
+                n -= len(offsets)
+                if i >= n:
+                    return base + offsets[i - n] + 1
+
+        i -= self.before_count
+        for end_base, offsets in reversed(self.after):
+            if i < len(offsets):
+                return length - end_base + offsets[i] + 1
+            i -= len(offsets)
+        return length
+
+    def line_of(self, offset, length):
+        """1-based line containing `offset`."""
+        count = self.before_count
+        if self.before and self.before[-1][0] + self.before[-1][1][-1] >= offset:
+            for base, offsets in reversed(self.before):
+                if base + offsets[0] < offset:
+                    return count - len(offsets) + bisect_left(offsets, offset - base) + 1
+                count -= len(offsets)
+            return count + 1
+
+        for end_base, offsets in reversed(self.after):
+            base = length - end_base
+            if base + offsets[-1] >= offset:
+                return count + bisect_left(offsets, offset - base) + 1
+            count += len(offsets)
+        return count + 1
+
+
+def _newlines(text, start=0, base=0):
+    positions = []
+    index = text.find('\n', start)
+    while index != -1:
+        positions.append(base + index)
+        index = text.find('\n', index + 1)
+    return positions
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+
+CACHE_DIR = ".goon_cache"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+class ProjectManifest:
+    """Cached listing of every folder in a project, kept under CACHE_DIR.
+
+    For each folder, keyed by its path relative to the project, the manifest
+    keeps the folder's mtime and its (name, is_folder, size, mtime_ns)
+    entries. A cached listing is only used while the folder's mtime is
+    unchanged, so reopening an unchanged project costs one stat per folder.
+    The file is read on first use, normally on a scanner thread, and written
+    by save(), normally on the watcher thread.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        # In its own folder so that saving it doesn't touch the project folder's mtime
+        self.path = os.path.join(folder, CACHE_DIR, MANIFEST_NAME)
+        self.dirs = {}
+        self.seen = set()
+        self.dirty = False
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            self.loaded = True
+            return self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return False
+
+        self.dirs = {key: (value["mtime"], [tuple(entry) for entry in value["entries"]])
+                     for key, value in data["dirs"].items()}
+        return True
+
+    def save(self):
+        """Write the manifest, dropping folders not seen since it was loaded."""
+        with self.lock:
+            self._ensure_loaded()
+            if not self.dirty and len(self.seen) == len(self.dirs):
+                return
+            dirs = {key: {"mtime": mtime, "entries": entries}
+                    for key, (mtime, entries) in self.dirs.items() if key in self.seen}
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "dirs": dirs}, f)
+        os.replace(temp_path, self.path)
+        with self.lock:
+            self.dirty = False
+
+    def lookup(self, path, mtime):
+        """Cached entries of the folder at `path`, or None if it changed since."""
+        key = self._key(path)
+        with self.lock:
+            self._ensure_loaded()
+            cached = self.dirs.get(key)
+            if cached is None or cached[0] != mtime:
+                return None
+            self.seen.add(key)
+            return cached[1]
+
+    def cached(self, path):
+        """(mtime, entries) last recorded for the folder at `path`, or None."""
+        with self.lock:
+            self._ensure_loaded()
+            return self.dirs.get(self._key(path))
+
+    def record(self, path, mtime, entries):
+        key = self._key(path)
+        with self.lock:
+            self._ensure_loaded()
+            self.dirs[key] = (mtime, entries)
+            self.seen.add(key)
+            self.dirty = True
+
+    def forget(self, path):
+        """Drop the folder at `path` and everything below it."""
+        key = self._key(path)
+        prefix = key + "/"
+        with self.lock:
+            self._ensure_loaded()
+            for name in [k for k in self.dirs if k == key or k.startswith(prefix)]:
+                del self.dirs[name]
+                self.seen.discard(name)
+            self.dirty = True
+
+    def _ensure_loaded(self):
+        # Called with the lock held
+        if not self.loaded:
+            self.loaded = True
+            self._read()
+
+    def _key(self, path):
+        return os.path.relpath(path, self.folder).replace(os.sep, "/")
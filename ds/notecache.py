@@ -0,0 +1,47 @@
+import sys
+from collections import OrderedDict
+
+
+class NoteCache:
+    """LRU cache of note texts keyed by file path.
+
+    Each entry remembers the file signature it was read with, and get()
+    only returns it while the file still has that signature, so edits made
+    outside the app are never hidden. The least recently used notes are
+    dropped once the cached texts exceed `max_bytes`.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+    def get(self, path, signature):
+        entry = self.entries.get(path)
+        if entry is None or signature is None:
+            return None
+        if entry[0] != signature:
+            self.discard(path)
+            return None
+        self.entries.move_to_end(path)
+        return entry[1]
+
+    def put(self, path, signature, content):
+        self.discard(path)
+        size = sys.getsizeof(content)
+        if signature is None or size > self.max_bytes:
+            return
+        self.entries[path] = (signature, content, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted
+
+    def discard(self, path):
+        entry = self.entries.pop(path, None)
+        if entry:
+            self.total_bytes -= entry[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
@@ -0,0 +1,253 @@
+import random
+
+from ds.textbuffer import TextBuffer
+
+CHUNK_SIZE = 512
+
+
+class _Node:
+    """Immutable treap node holding one chunk of text.
+
+    Nodes are never modified after creation, so edits copy only the path
+    they touch and older roots remain valid snapshots.
+    """
+    __slots__ = ('text', 'left', 'right', 'priority', 'size', 'newlines')
+
+    def __init__(self, text, left, right, priority):
+        self.text = text
+        self.left = left
+        self.right = right
+        self.priority = priority
+        self.size = len(text) + _size(left) + _size(right)
+        self.newlines = text.count('\n') + _newlines(left) + _newlines(right)
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _newlines(node):
+    return node.newlines if node else 0
+
+
+def _split(node, k):
+    """Split into (first k characters, rest)."""
+    if node is None:
+        return None, None
+
+    left_size = _size(node.left)
+    if k <= left_size:
+        left, right = _split(node.left, k)
+        return left, _Node(node.text, right, node.right, node.priority)
+
+    k -= left_size
+    if k >= len(node.text):
+        left, right = _split(node.right, k - len(node.text))
+        return _Node(node.text, node.left, left, node.priority), right
+
+    return (_Node(node.text[:k], node.left, None, node.priority),
+            _Node(node.text[k:], None, node.right, node.priority))
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+
+    if left.priority >= right.priority:
+        return _Node(left.text, left.left, _merge(left.right, right), left.priority)
+    return _Node(right.text, _merge(left, right.left), right.right, right.priority)
+
+
+def _edge(node, side):
+    while getattr(node, side):
+        node = getattr(node, side)
+    return node
+
+
+def _pop_last(node):
+    """(node without its last chunk, that chunk's node)."""
+    if node.right is None:
+        return node.left, node
+    right, last = _pop_last(node.right)
+    return _Node(node.text, node.left, right, node.priority), last
+
+
+def _pop_first(node):
+    if node.left is None:
+        return node, node.right
+    first, left = _pop_first(node.left)
+    return first, _Node(node.text, left, node.right, node.priority)
+
+
+def _concat(left, right):
+    """_merge, folding the two chunks that meet at the seam into one if they fit.
+
+    Without this every delete leaves the chunks it cut through behind as
+    two fragments, and backspacing through a note keeps adding nodes.
+    """
+    if left is None or right is None:
+        return _merge(left, right)
+    if len(_edge(left, 'right').text) + len(_edge(right, 'left').text) > CHUNK_SIZE:
+        return _merge(left, right)
+
+    left, last = _pop_last(left)
+    first, right = _pop_first(right)
+    seam = _Node(last.text + first.text, None, None, max(last.priority, first.priority))
+    return _merge(_merge(left, seam), right)
+
+
+def _splice(node, k, text):
+    """Insert `text` into the chunk covering offset k, or None if it would overflow."""
+    if node is None:
+        return None
+
+    left_size = _size(node.left)
+    if k < left_size:
+        left = _splice(node.left, k, text)
+        return left and _Node(node.text, left, node.right, node.priority)
+
+    k -= left_size
+    if k <= len(node.text):
+        if len(node.text) + len(text) > CHUNK_SIZE:
+            return None
+        return _Node(node.text[:k] + text + node.text[k:], node.left, node.right, node.priority)
+
+    right = _splice(node.right, k - len(node.text), text)
+    return right and _Node(node.text, node.left, right, node.priority)
+
+
+def _build(chunks, lo, hi, depth, height):
+    # Priorities fall with depth so the balanced shape is already a valid treap
+    if lo >= hi:
+        return None
+
+    mid = (lo + hi) // 2
+    priority = (height - depth - random.random()) / height
+    return _Node(chunks[mid],
+                 _build(chunks, lo, mid, depth + 1, height),
+                 _build(chunks, mid + 1, hi, depth + 1, height),
+                 priority)
+
+
+def _from_text(text):
+    chunks = [text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
+    return _build(chunks, 0, len(chunks), 0, max(len(chunks).bit_length(), 1))
+
+
+def _join(node):
+    parts = []
+    stack = []
+    while stack or node:
+        if node:
+            stack.append(node)
+            node = node.left
+        else:
+            node = stack.pop()
+            parts.append(node.text)
+            node = node.right
+    return "".join(parts)
+
+
+class Rope(TextBuffer):
+    """Persistent treap of text chunks: O(log n) edits anywhere and O(1) snapshots."""
+
+    def __init__(self, text=""):
+        self.root = _from_text(text)
+        self.cursor_position = 0
+
+    def _clamp(self, position):
+        return max(0, min(position, _size(self.root)))
+
+    def insert_text(self, text, position=None):
+        k = self.cursor_position if position is None else self._clamp(position)
+        if text:
+            root = _splice(self.root, k, text) if len(text) < CHUNK_SIZE else None
+            if root is None:
+                left, right = _split(self.root, k)
+                root = _concat(_concat(left, _from_text(text)), right)
+            self.root = root
+        self.cursor_position = k + len(text)
+
+    def delete_range(self, start, end):
+        start = self._clamp(start)
+        end = max(start, self._clamp(end))
+
+        left, rest = _split(self.root, start)
+        middle, right = _split(rest, end - start)
+        self.root = _concat(left, right)
+        self.cursor_position = start
+        return _join(middle)
+
+    def move_cursor(self, position):
+        self.cursor_position = self._clamp(position)
+
+    def get_text(self):
+        return _join(self.root)
+
+    def get_text_length(self):
+        return _size(self.root)
+
+    def set_text(self, text):
+        self.root = _from_text(text)
+        self.cursor_position = 0
+
+    def clear(self):
+        self.set_text("")
+
+    def snapshot(self):
+        copy = Rope()
+        copy.root = self.root
+        copy.cursor_position = self.cursor_position
+        return copy
+
+    def line_count(self):
+        return _newlines(self.root) + 1
+
+    def line_start(self, line):
+        if line <= 1:
+            return 0
+        if line > self.line_count():
+            return _size(self.root)
+
+        # Find the (line - 1)-th newline and step past it
+        k = line - 1
+        offset = 0
+        node = self.root
+        while True:
+            if k <= _newlines(node.left):
+                node = node.left
+                continue
+            k -= _newlines(node.left)
+            offset += _size(node.left)
+            in_chunk = node.text.count('\n')
+            if k <= in_chunk:
+                index = -1
+                for _ in range(k):
+                    index = node.text.index('\n', index + 1)
+                return offset + index + 1
+            k -= in_chunk
+            offset += len(node.text)
+            node = node.right
+
+    def line_of(self, offset):
+        count = 0
+        node = self.root
+        while node:
+            left_size = _size(node.left)
+            if offset <= left_size:
+                node = node.left
+                continue
+            count += _newlines(node.left)
+            offset -= left_size
+            if offset <= len(node.text):
+                count += node.text.count('\n', 0, offset)
+                break
+            count += node.text.count('\n')
+            offset -= len(node.text)
+            node = node.right
+        return count + 1
+
+    def __str__(self):
+        return f"Rope(text='{self.get_text()[:50]}...', cursor={self.cursor_position}, length={self.get_text_length()})"
@@ -0,0 +1,106 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from ds.watcher import file_signature
+
+
+def write_atomic(path, content):
+    """Write `content` to a temp file beside `path`, then rename it over `path`."""
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+
+class SaveWriter:
+    """Saves files on a background thread.
+
+    submit() only queues the text; a later submit for the same path before
+    the write starts replaces it, so a burst of saves costs one write. The
+    thread takes everything queued as one batch. Each finished write shows
+    up in poll() as (path, content, signature, error), and until it has
+    been polled the path counts as pending. If `encode` is set, it turns
+    each text into what actually goes into the file.
+    """
+
+    def __init__(self):
+        self.encode = None
+        self.queued = OrderedDict()
+        self.unreported = {}
+        self.writing = set()
+        self.results = queue.Queue()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, path, content):
+        with self.condition:
+            self.queued[path] = content
+            self.unreported[path] = content
+            self.condition.notify_all()
+
+    def content_for(self, path):
+        """Text most recently submitted for `path` that hasn't been reported yet."""
+        with self.condition:
+            return self.unreported.get(path)
+
+    def is_pending(self, path):
+        with self.condition:
+            return path in self.unreported
+
+    def has_pending(self):
+        with self.condition:
+            return bool(self.unreported)
+
+    def poll(self):
+        results = []
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return results
+            path, content = result[0], result[1]
+            with self.condition:
+                # Still pending if newer text was submitted after this write began
+                if self.unreported.get(path) is content:
+                    del self.unreported[path]
+            results.append(result)
+
+    def flush(self):
+        """Block until every queued write has landed."""
+        with self.condition:
+            while self.queued or self.writing:
+                self.condition.wait()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.queued:
+                    self.condition.wait()
+                batch = list(self.queued.items())
+                self.queued.clear()
+                self.writing = {path for path, _ in batch}
+
+            try:
+                for path, content in batch:
+                    try:
+                        encode = self.encode
+                        write_atomic(path, encode(content) if encode else content)
+                        self.results.put((path, content, file_signature(path), None))
+                    # Not just OSError: a lone surrogate or a failing encoder must not end the thread
+                    except Exception as e:
+                        self.results.put((path, content, None, e))
+            finally:
+                # flush() waits on this, so it is cleared even if the loop itself fails
+                with self.condition:
+                    self.writing = set()
+                    self.condition.notify_all()
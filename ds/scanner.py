@@ -0,0 +1,142 @@
+import itertools
+import os
+import queue
+import threading
+
+from ds.treenode import TreeNode
+
+URGENT = 0
+BACKGROUND = 1
+
+
+def list_directory(path):
+    """(name, is_folder, size, mtime_ns) for the notes and subfolders directly inside `path`, sorted by name."""
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            # Hidden folders hold app caches and tool data (.git), not notes
+            if entry.name.startswith('.'):
+                continue
+            # DirEntry reuses the type from the directory listing, so no extra stat per entry
+            if entry.is_dir():
+                entries.append((entry.name, True, 0, 0))
+            elif entry.name.endswith('.goon'):
+                stat = entry.stat()
+                entries.append((entry.name, False, stat.st_size, stat.st_mtime_ns))
+    entries.sort()
+    return entries
+
+
+def scan_directory(path, manifest=None):
+    """Notes and subfolders directly inside `path`, sorted by name, as detached TreeNodes.
+
+    With a manifest, the folder is only listed again if its mtime changed.
+    """
+    if manifest is None:
+        entries = list_directory(path)
+    else:
+        # Stat before listing, so a change made during the listing shows up next time
+        mtime = os.stat(path).st_mtime_ns
+        entries = manifest.lookup(path, mtime)
+        if entries is None:
+            entries = list_directory(path)
+            manifest.record(path, mtime, entries)
+
+    children = []
+    for name, is_folder, _, _ in entries:
+        node = TreeNode(name, is_folder=is_folder)
+        node.children_loaded = not is_folder
+        children.append(node)
+    return children
+
+
+class ProjectScanner:
+    """Scans a project tree on worker threads and queues results for the UI thread.
+
+    Each submitted folder is listed with scan_directory(); its subfolders are
+    then queued behind it, so the whole tree streams in level by level.
+    Nothing here touches the TreeNodes passed in: poll() hands back
+    (node, children, error) and the caller attaches the children itself.
+    Folders whose listing is still current in `manifest` are not listed again.
+    Submitting a folder that is already queued only raises its priority, and
+    one that is being scanned or waiting in poll() is left alone.
+    """
+
+    def __init__(self, workers=8, manifest=None):
+        self.manifest = manifest
+        self.tasks = queue.PriorityQueue()
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        # node -> (priority, sequence number) of its live task; older entries are skipped
+        self.queued = {}
+        # Submitted nodes whose results poll() hasn't handed back yet
+        self.pending = set()
+        self.outstanding = 0
+        self.scanned = 0
+        self.stopped = False
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, node, path, priority=BACKGROUND):
+        with self.lock:
+            queued = self.queued.get(node)
+            if queued is not None:
+                if priority >= queued[0]:
+                    return
+            elif node in self.pending:
+                return
+            else:
+                self.outstanding += 1
+                self.pending.add(node)
+            count = next(self.counter)
+            self.queued[node] = (priority, count)
+        self.tasks.put((priority, count, node, path))
+
+    def poll(self, limit=200):
+        results = []
+        while len(results) < limit:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        with self.lock:
+            for node, _, _ in results:
+                self.pending.discard(node)
+        return results
+
+    def is_done(self):
+        with self.lock:
+            return self.outstanding == 0 and self.results.empty()
+
+    def stop(self):
+        self.stopped = True
+        for _ in self.threads:
+            self.tasks.put((BACKGROUND + 1, next(self.counter), None, None))
+
+    def _work(self):
+        while True:
+            _, count, node, path = self.tasks.get()
+            if node is None:
+                return
+            with self.lock:
+                if self.queued.get(node, (None, None))[1] != count:
+                    # Superseded by a higher-priority entry for the same folder
+                    continue
+                del self.queued[node]
+
+            if not self.stopped:
+                try:
+                    children = scan_directory(path, self.manifest)
+                    # Queued before the UI can see them, so expanding one only reprioritizes it
+                    for child in children:
+                        if child.is_folder:
+                            self.submit(child, os.path.join(path, child.name))
+                    self.results.put((node, children, None))
+                except OSError as e:
+                    self.results.put((node, [], e))
+
+            with self.lock:
+                self.outstanding -= 1
+                self.scanned += 1
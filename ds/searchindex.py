@@ -0,0 +1,141 @@
+import heapq
+import math
+import os
+import re
+import threading
+
+from ds.contentstore import read_note_file
+from ds.scanner import list_directory
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """(token, offset) for every word in `text`, lowercased."""
+    return [(match.group().lower(), match.start()) for match in TOKEN_RE.finditer(text)]
+
+
+class SearchIndex:
+    """Inverted index over note texts: token -> {note id: [offsets]}.
+
+    Notes are keyed by their "/"-separated path inside the project and get
+    a small integer id, so renaming a note or folder only touches the key
+    maps. search() ranks the notes containing every query word by tf-idf.
+    All methods are safe to call from the background builder and the UI
+    thread at the same time.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.postings = {}
+        self.doc_ids = {}
+        self.keys = {}
+        self.doc_tokens = {}
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.ready = False
+        self.cancelled = False
+
+    def add(self, key, text, replace=True):
+        """Index `text` as the note `key`; with replace=False an indexed note is left alone."""
+        positions = {}
+        for token, offset in tokenize(text):
+            positions.setdefault(token, []).append(offset)
+
+        with self.lock:
+            if key in self.doc_ids:
+                if not replace:
+                    return
+                self._remove(key)
+            doc_id = self.next_id
+            self.next_id += 1
+            self.doc_ids[key] = doc_id
+            self.keys[doc_id] = key
+            self.doc_tokens[doc_id] = list(positions)
+            for token, offsets in positions.items():
+                self.postings.setdefault(token, {})[doc_id] = offsets
+
+    def add_file(self, key, path, replace=True):
+        try:
+            text = read_note_file(path, self.store)
+        except (OSError, ValueError):
+            return
+        self.add(key, text, replace)
+
+    def remove(self, key):
+        """Drop the note `key`, or every note below it if it is a folder."""
+        prefix = key + "/"
+        with self.lock:
+            for name in [k for k in self.doc_ids if k == key or k.startswith(prefix)]:
+                self._remove(name)
+
+    def rename(self, old_key, new_key):
+        prefix = old_key + "/"
+        with self.lock:
+            for name in [k for k in self.doc_ids if k == old_key or k.startswith(prefix)]:
+                doc_id = self.doc_ids.pop(name)
+                renamed = new_key + name[len(old_key):]
+                self.doc_ids[renamed] = doc_id
+                self.keys[doc_id] = renamed
+
+    def search(self, query, limit=50):
+        """Best `limit` notes containing every word of `query`, as (key, score, hits)."""
+        tokens = {token for token, _ in tokenize(query)}
+        if not tokens:
+            return []
+
+        with self.lock:
+            lists = [self.postings.get(token) for token in tokens]
+            if not all(lists):
+                return []
+            # Walk the rarest word's notes and probe the others
+            lists.sort(key=len)
+            total = len(self.doc_ids)
+            weights = [math.log(1 + total / len(docs)) for docs in lists]
+
+            scored = []
+            for doc_id in lists[0]:
+                score = 0.0
+                hits = 0
+                for docs, weight in zip(lists, weights):
+                    offsets = docs.get(doc_id)
+                    if offsets is None:
+                        break
+                    score += (1 + math.log(len(offsets))) * weight
+                    hits += len(offsets)
+                else:
+                    scored.append((score, hits, self.keys[doc_id]))
+
+        best = heapq.nlargest(limit, scored)
+        return [(key, score, hits) for score, hits, key in best]
+
+    def build(self, folder, path=None):
+        """Index every note under `path` (default: all of `folder`); runs on a background thread."""
+        stack = [path or folder]
+        while stack and not self.cancelled:
+            current = stack.pop()
+            try:
+                entries = list_directory(current)
+            except OSError:
+                continue
+            for name, is_folder, _, _ in entries:
+                full_path = os.path.join(current, name)
+                if is_folder:
+                    stack.append(full_path)
+                else:
+                    key = os.path.relpath(full_path, folder).replace(os.sep, "/")
+                    # Notes saved meanwhile are already indexed with newer text
+                    self.add_file(key, full_path, replace=False)
+        if path is None:
+            self.ready = True
+
+    def _remove(self, key):
+        doc_id = self.doc_ids.pop(key, None)
+        if doc_id is None:
+            return
+        del self.keys[doc_id]
+        for token in self.doc_tokens.pop(doc_id):
+            docs = self.postings[token]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[token]
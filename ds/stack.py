@@ -1,22 +1,52 @@
+import sys
+from collections import deque
+
+
 class Stack:
-    def __init__(self):
-        self.items = []
-    
+    """LIFO stack with optional capacity limits.
+
+    When `max_items` or `max_bytes` is exceeded the oldest entries are
+    evicted, though the newest entry is always kept. `sizeof` measures an
+    item in bytes and defaults to sys.getsizeof.
+    """
+
+    def __init__(self, max_items=None, max_bytes=None, sizeof=sys.getsizeof):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.items = deque()
+        self.sizes = deque()
+        self.total_bytes = 0
+
     def push(self, item):
+        size = self.sizeof(item)
         self.items.append(item)
-    
+        self.sizes.append(size)
+        self.total_bytes += size
+        self._evict()
+
     def pop(self):
         if not self.is_empty():
+            self.total_bytes -= self.sizes.pop()
             return self.items.pop()
         return None
-    
+
     def peek(self):
         if not self.is_empty():
             return self.items[-1]
         return None
-    
+
     def is_empty(self):
         return len(self.items) == 0
-    
+
     def clear(self):
-        self.items = []
+        self.items = deque()
+        self.sizes = deque()
+        self.total_bytes = 0
+
+    def _evict(self):
+        while len(self.items) > 1 and (
+                (self.max_items is not None and len(self.items) > self.max_items) or
+                (self.max_bytes is not None and self.total_bytes > self.max_bytes)):
+            self.items.popleft()
+            self.total_bytes -= self.sizes.popleft()
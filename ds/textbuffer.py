@@ -0,0 +1,92 @@
+from abc import ABC, abstractmethod
+
+ROPE_THRESHOLD = 256 * 1024
+
+
+class TextBuffer(ABC):
+    """Interface shared by the text engines behind the note editor.
+
+    Offsets are code-point positions in the text; ranges are half-open.
+    """
+
+    @abstractmethod
+    def insert_text(self, text, position=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_range(self, start, end):
+        raise NotImplementedError
+
+    def replace_range(self, start, end, text):
+        removed = self.delete_range(start, end)
+        self.insert_text(text, start)
+        return removed
+
+    @abstractmethod
+    def move_cursor(self, position):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_text(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_text_length(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_text(self, text):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def snapshot(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def line_count(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def line_start(self, line):
+        """Offset where 1-based `line` begins; the text length past the last line."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def line_of(self, offset):
+        """1-based line containing `offset`."""
+        raise NotImplementedError
+
+    def offset_to_line_col(self, offset):
+        offset = max(0, min(offset, self.get_text_length()))
+        line = self.line_of(offset)
+        return line, offset - self.line_start(line)
+
+    def line_col_to_offset(self, line, column):
+        """Offset of (1-based line, 0-based column in code points), clamped to the text."""
+        if line > self.line_count():
+            return self.get_text_length()
+        if line == self.line_count():
+            line_end = self.get_text_length()
+        else:
+            line_end = self.line_start(line + 1) - 1
+        return min(self.line_start(line) + max(column, 0), line_end)
+
+    def get_info(self):
+        return {
+            'engine': type(self).__name__,
+            'text_length': self.get_text_length()
+        }
+
+
+def make_text_buffer(size=0):
+    """Pick an engine for a note of `size` characters."""
+    if size >= ROPE_THRESHOLD:
+        from ds.rope import Rope
+        return Rope()
+
+    from ds.gapbuffer import GapBuffer
+    return GapBuffer()
@@ -1,24 +1,96 @@
 class TreeNode:
+    __slots__ = ('_name', 'is_folder', 'content', 'parent', '_children', '_child_names',
+                 '_path', 'tree_id', 'children_loaded', 'uid')
+
     def __init__(self, name, is_folder=True, content="", parent=None):
-        self.name = name
+        self._name = name
         self.is_folder = is_folder
         self.content = content
         self.parent = parent
-        self.children = []
+        # Insertion-ordered dict used as an ordered set for O(1) removal
+        self._children = {}
+        # name -> children with that name, built on the first lookup and kept up to date after
+        self._child_names = None
+        # Names from the root down to this node, cached until a rename or move
+        self._path = None
         self.tree_id = None
-    
+        self.children_loaded = True
+        # Stable identity for files kept per note, such as undo journals; saved with the project
+        self.uid = None
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        names = self.parent._child_names if self.parent else None
+        if names is not None and self in self.parent._children:
+            _unindex(names, self._name, self)
+            names.setdefault(value, []).append(self)
+        self._name = value
+        self._invalidate_path()
+
+    @property
+    def children(self):
+        return self._children.keys()
+
     def add_child(self, child):
         child.parent = self
-        self.children.append(child)
-    
+        child._invalidate_path()
+        if child in self._children:
+            return
+        self._children[child] = None
+        if self._child_names is not None:
+            self._child_names.setdefault(child.name, []).append(child)
+
     def remove_child(self, child):
-        if child in self.children:
-            self.children.remove(child)
-    
+        if child in self._children:
+            del self._children[child]
+            if self._child_names is not None:
+                _unindex(self._child_names, child.name, child)
+
+    def get_child(self, name):
+        children = self.get_children(name)
+        return children[0] if children else None
+
+    def get_children(self, name):
+        """Every child called `name`; sibling names are not guaranteed to be unique."""
+        if self._child_names is None:
+            self._child_names = {}
+            for child in self._children:
+                self._child_names.setdefault(child.name, []).append(child)
+        return tuple(self._child_names.get(name, ()))
+
+    def get_path_parts(self):
+        if self._path is None:
+            pending = []
+            node = self
+            while node is not None and node._path is None:
+                pending.append(node)
+                node = node.parent
+            path = node._path if node is not None else ()
+            for node in reversed(pending):
+                path = path + (node._name,)
+                node._path = path
+        return self._path
+
     def get_path(self):
-        path = []
-        node = self
-        while node:
-            path.insert(0, node.name)
-            node = node.parent
-        return "/".join(path)
+        return "/".join(self.get_path_parts())
+
+    def _invalidate_path(self):
+        # A node's path is only cached after its parent's, so uncached nodes end the walk
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._path is not None:
+                node._path = None
+                stack.extend(node._children)
+
+
+def _unindex(names, name, child):
+    siblings = names.get(name)
+    if siblings and child in siblings:
+        siblings.remove(child)
+        if not siblings:
+            del names[name]
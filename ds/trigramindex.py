@@ -0,0 +1,163 @@
+import heapq
+import re
+import threading
+from collections import Counter
+from itertools import islice
+
+SEPARATOR_RE = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    """Lowercase `text` and turn every run of punctuation into a single space."""
+    return " " + SEPARATOR_RE.sub(" ", text.lower()).strip()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Fuzzy lookup of notes by name and path through trigram indexes.
+
+    Names and paths (without .goon) are normalized and split into
+    trigrams; a leading space marks word starts, so two-letter queries
+    match the beginning of words. search() ranks notes whose name has
+    every query trigram first, then notes whose path has them all, then
+    notes sharing at least half of them. Ties go to the shorter name or
+    path. Candidate sets come from C-level set intersections, so only
+    the survivors are touched in Python. All methods are safe to call
+    from an indexing thread and the UI thread at the same time.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def add(self, node):
+        with self.lock:
+            self._add(node)
+
+    def _add(self, node):
+        if node.is_folder or node in self.ids:
+            return
+        path = "/".join(node.get_path_parts()[1:])
+        if path.endswith('.goon'):
+            path = path[:-5]
+        name = node.name[:-5] if node.name.endswith('.goon') else node.name
+        text = normalize(path)
+        name = normalize(name)
+
+        entry_id = self.next_id
+        self.next_id += 1
+        self.ids[node] = entry_id
+        self.entries[entry_id] = (node, text, name)
+        self.path_lengths[entry_id] = len(text)
+        self.name_lengths[entry_id] = len(name)
+        for gram in trigrams(text):
+            self.postings.setdefault(gram, set()).add(entry_id)
+        for gram in trigrams(name):
+            self.name_postings.setdefault(gram, set()).add(entry_id)
+
+    def remove(self, node):
+        with self.lock:
+            self._remove(node)
+
+    def _remove(self, node):
+        entry_id = self.ids.pop(node, None)
+        if entry_id is None:
+            return
+        _, text, name = self.entries.pop(entry_id)
+        del self.path_lengths[entry_id]
+        del self.name_lengths[entry_id]
+        _discard(self.postings, trigrams(text), entry_id)
+        _discard(self.name_postings, trigrams(name), entry_id)
+
+    def add_subtree(self, node):
+        with self.lock:
+            for current in _walk(node):
+                self._add(current)
+
+    def remove_subtree(self, node):
+        with self.lock:
+            for current in _walk(node):
+                self._remove(current)
+
+    def update_subtree(self, node):
+        """Re-index a renamed or moved node and everything below it."""
+        with self.lock:
+            self.remove_subtree(node)
+            self.add_subtree(node)
+
+    def search(self, query, limit=50):
+        query = normalize(query)
+        if len(query) < 3:
+            return []
+        grams = trigrams(query)
+        with self.lock:
+            return self._search(grams, limit)
+
+    def _search(self, grams, limit):
+        path_sets = sorted((self.postings.get(gram, _EMPTY) for gram in grams), key=len)
+        name_sets = [self.name_postings.get(gram, _EMPTY) for gram in grams]
+
+        in_name = name_sets[0].intersection(*name_sets[1:])
+        found = _shortest(in_name, limit, self.name_lengths)
+
+        if len(found) < limit:
+            in_path = path_sets[0].intersection(*path_sets[1:]) - in_name
+            found += _shortest(in_path, limit - len(found), self.path_lengths)
+
+        if len(found) < limit:
+            # A note missing at most `misses` trigrams has one of the rarest misses + 1
+            misses = len(path_sets) // 2
+            rarest = path_sets[:misses + 1]
+            if found and sum(map(len, rarest)) > RANK_LIMIT:
+                # Exact matches exist and the near misses are too many to be useful
+                return [self.entries[entry_id][0] for entry_id in found]
+            candidates = set().union(*rarest).difference(found)
+            counts = Counter()
+            for ids in path_sets:
+                counts.update(ids & candidates)
+            needed = len(path_sets) - misses
+            scored = [(-hits, self.path_lengths[entry_id], entry_id)
+                      for entry_id, hits in counts.items() if hits >= needed]
+            found += [entry_id for _, _, entry_id in heapq.nsmallest(limit - len(found), scored)]
+
+        return [self.entries[entry_id][0] for entry_id in found]
+
+    def clear(self):
+        with self.lock:
+            self.postings = {}
+            self.name_postings = {}
+            self.ids = {}
+            self.entries = {}
+            self.path_lengths = {}
+            self.name_lengths = {}
+            self.next_id = 0
+
+
+_EMPTY = frozenset()
+RANK_LIMIT = 20000
+
+
+def _shortest(ids, count, lengths):
+    if len(ids) > RANK_LIMIT:
+        # Too vague to be worth ordering (e.g. a folder name every path shares)
+        return list(islice(ids, count))
+    return heapq.nsmallest(count, ids, key=lengths.__getitem__)
+
+
+def _discard(postings, grams, entry_id):
+    for gram in grams:
+        ids = postings[gram]
+        ids.discard(entry_id)
+        if not ids:
+            del postings[gram]
+
+
+def _walk(node):
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(current.children)
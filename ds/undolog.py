@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import sys
+
+from ds.stack import Stack
+
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+
+
+class Edit:
+    """One change to a note: `removed` was replaced by `inserted` at `offset`."""
+    __slots__ = ('offset', 'removed', 'inserted')
+
+    def __init__(self, offset, removed, inserted):
+        self.offset = offset
+        self.removed = removed
+        self.inserted = inserted
+
+    def absorb(self, edit):
+        """Fold a directly following edit into this one when they form a typing run."""
+        if not edit.removed and edit.offset == self.offset + len(self.inserted):
+            self.inserted += edit.inserted
+            return True
+
+        if not self.inserted and not edit.inserted:
+            if edit.offset + len(edit.removed) == self.offset:
+                self.offset = edit.offset
+                self.removed = edit.removed + self.removed
+                return True
+            if edit.offset == self.offset:
+                self.removed += edit.removed
+                return True
+
+        return False
+
+
+def group_size(group):
+    """Approximate bytes held by one undo step."""
+    size = sys.getsizeof(group)
+    for edit in group:
+        size += sys.getsizeof(edit) + sys.getsizeof(edit.removed) + sys.getsizeof(edit.inserted)
+    return size
+
+
+def text_digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class UndoJournal:
+    """Append-only file of undo operations for one note.
+
+    Each line is a JSON list: ["push", [[offset, removed, inserted], ...]],
+    ["undo"], ["redo"] or ["save", digest]. A "save" line records the digest
+    of the note text the operations before it lead to, so a journal whose
+    note was changed elsewhere can be recognised and ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, ops, text):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for op in ops:
+                f.write(_encode_op(op) + "\n")
+            f.write(json.dumps(["save", text_digest(text)]) + "\n")
+
+    def rewrite(self, ops, text):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for op in ops:
+                f.write(_encode_op(op) + "\n")
+            f.write(json.dumps(["save", text_digest(text)]) + "\n")
+        os.replace(temp_path, self.path)
+
+    def read(self, text):
+        """Operations up to the last save, or None if that save doesn't match `text`."""
+        ops = []
+        saved = 0
+        digest = None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from an interrupted write
+                        break
+                    if entry[0] == "save":
+                        saved = len(ops)
+                        digest = entry[1]
+                    elif entry[0] == "push":
+                        ops.append(("push", [Edit(*edit) for edit in entry[1]]))
+                    else:
+                        ops.append((entry[0],))
+        except OSError:
+            return None
+
+        if digest != text_digest(text):
+            return None
+        return ops[:saved]
+
+    def last_digest(self):
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 256))
+                tail = f.read()
+            entry = json.loads(tail.splitlines()[-1])
+        except (OSError, IndexError, ValueError):
+            return None
+        return entry[1] if entry[0] == "save" else None
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def move(self, new_path):
+        if os.path.exists(self.path):
+            os.replace(self.path, new_path)
+        self.path = new_path
+
+
+def _encode_op(op):
+    if op[0] == "push":
+        return json.dumps(["push", [[e.offset, e.removed, e.inserted] for e in op[1]]])
+    return json.dumps([op[0]])
+
+
+class UndoLog:
+    """Undo/redo history that stores edit deltas instead of whole-note snapshots.
+
+    Edits are gathered into `pending` until commit() closes the typing run,
+    which pushes them as a single undo step. `max_steps` and `max_bytes`
+    bound each stack; the oldest steps are dropped first.
+
+    With a journal attached, operations since the last save are written out
+    by save(), and the earlier history is only read back the first time
+    undo() or redo() needs it.
+    """
+
+    def __init__(self, max_steps=None, max_bytes=None):
+        self.undo_stack = Stack(max_steps, max_bytes, group_size)
+        self.redo_stack = Stack(max_steps, max_bytes, group_size)
+        self.pending = []
+        self.ops = []
+        self.journal = None
+        self.loaded = True
+        self.saved_text = None
+        self.journal_valid = False
+
+    def attach(self, journal, text):
+        """Start the history of a note whose saved text is `text`."""
+        self.clear()
+        self.journal = journal
+        self.loaded = journal is None
+        self.saved_text = None if self.loaded else text
+
+    def record(self, offset, removed, inserted):
+        edit = Edit(offset, removed, inserted)
+        if not (self.pending and self.pending[-1].absorb(edit)):
+            self.pending.append(edit)
+
+    def commit(self):
+        if not self.pending:
+            return False
+
+        self._apply(("push", self.pending))
+        self.pending = []
+        return True
+
+    def undo(self):
+        self.commit()
+        self._load()
+        return self._apply(("undo",))
+
+    def redo(self):
+        self.commit()
+        self._load()
+        return self._apply(("redo",))
+
+    def save(self, text):
+        """Write the operations since the last save to the journal."""
+        self.commit()
+        if not self.journal:
+            return
+
+        if self.loaded:
+            valid = self.journal_valid
+        else:
+            valid = self.journal.last_digest() == text_digest(self.saved_text)
+
+        if valid and self.journal.size() <= JOURNAL_COMPACT_BYTES:
+            self.journal.append(self.ops, text)
+        else:
+            # Stale or oversized: replace the file with the current stacks
+            self._load()
+            self.journal.rewrite(self._snapshot_ops(), text)
+        self.ops = []
+        self.journal_valid = True
+        if not self.loaded:
+            self.saved_text = text
+
+    def _apply(self, op):
+        group = None
+        if op[0] == "push":
+            group = op[1]
+            self.undo_stack.push(group)
+            self.redo_stack.clear()
+        elif op[0] == "undo":
+            group = self.undo_stack.pop()
+            if group:
+                self.redo_stack.push(group)
+        elif op[0] == "redo":
+            group = self.redo_stack.pop()
+            if group:
+                self.undo_stack.push(group)
+
+        if group:
+            self.ops.append(op)
+        return group
+
+    def _load(self):
+        if self.loaded:
+            return
+
+        session_ops = self.ops
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.ops = []
+        journal_ops = self.journal.read(self.saved_text)
+        self.journal_valid = journal_ops is not None
+        for op in (journal_ops or []) + session_ops:
+            self._apply(op)
+        self.ops = session_ops
+        self.loaded = True
+        self.saved_text = None
+
+    def _snapshot_ops(self):
+        # Replaying these rebuilds both stacks: every step pushed, then the redo ones undone
+        redo_groups = list(reversed(self.redo_stack.items))
+        ops = [("push", group) for group in list(self.undo_stack.items) + redo_groups]
+        return ops + [("undo",)] * len(redo_groups)
+
+    def get_footprint(self):
+        return self.undo_stack.total_bytes + self.redo_stack.total_bytes
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.pending = []
+        self.ops = []
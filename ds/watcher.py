@@ -0,0 +1,108 @@
+import os
+import queue
+import threading
+
+from ds.scanner import list_directory
+
+
+def file_signature(path):
+    """(mtime_ns, size, inode) of a file, or None if it can't be read."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class ProjectWatcher:
+    """Polls a project folder for notes and folders added or removed outside the app.
+
+    The listings in `manifest` are the baseline: every `interval` seconds
+    each folder is stat'ed, and only folders whose mtime moved are listed
+    again and compared with what the manifest had. The differences are
+    queued as ("added" | "removed", parent_parts, name, is_folder) tuples,
+    where parent_parts are the folder names from the project root down.
+    The manifest is saved from the watcher thread whenever it changed; the
+    last failure to save is kept in `save_error`.
+    """
+
+    def __init__(self, folder, manifest, interval=2.0):
+        self.folder = folder
+        self.manifest = manifest
+        self.interval = interval
+        self.changes = queue.Queue()
+        self.save_error = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def poll(self):
+        changes = []
+        while True:
+            try:
+                changes.extend(self.changes.get_nowait())
+            except queue.Empty:
+                return changes
+
+    def stop(self):
+        self.stop_event.set()
+
+    def check(self):
+        """Walk the project once and return the changes since the last walk."""
+        changes = []
+        stack = [self.folder]
+        while stack and not self.stop_event.is_set():
+            path = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                # Gone: reported as removed in its parent's listing
+                continue
+
+            cached = self.manifest.cached(path)
+            if cached is not None and cached[0] == mtime:
+                entries = cached[1]
+            else:
+                try:
+                    entries = list_directory(path)
+                except OSError:
+                    continue
+                self.manifest.record(path, mtime, entries)
+                # A folder without a baseline is new, and its parent already reported it
+                if cached is not None:
+                    changes.extend(self._diff(path, cached[1], entries))
+
+            for name, is_folder, _, _ in entries:
+                if is_folder:
+                    stack.append(os.path.join(path, name))
+        return changes
+
+    def _diff(self, path, old_entries, new_entries):
+        old = {(name, is_folder) for name, is_folder, _, _ in old_entries}
+        new = {(name, is_folder) for name, is_folder, _, _ in new_entries}
+        parts = () if path == self.folder else tuple(os.path.relpath(path, self.folder).split(os.sep))
+
+        changes = []
+        for name, is_folder in sorted(old - new):
+            if is_folder:
+                self.manifest.forget(os.path.join(path, name))
+            changes.append(("removed", parts, name, is_folder))
+        for name, is_folder in sorted(new - old):
+            changes.append(("added", parts, name, is_folder))
+        return changes
+
+    def _save_manifest(self):
+        try:
+            self.manifest.save()
+            self.save_error = None
+        except OSError as e:
+            self.save_error = e
+
+    def _run(self):
+        # The scan that came before has filled the manifest in
+        self._save_manifest()
+        while not self.stop_event.wait(self.interval):
+            changes = self.check()
+            if changes:
+                self.changes.put(changes)
+            self._save_manifest()
@@ -2,39 +2,83 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import json
 import os
+import queue
 import shutil
+import threading
+import time
 
-from ds.stack import Stack
+from ds.undolog import UndoLog, UndoJournal
 from ds.treenode import TreeNode
 from ds.gapbuffer import GapBuffer
+from ds.textbuffer import make_text_buffer
+from ds.editsync import EditSync
+from ds.manifest import ProjectManifest, CACHE_DIR
+from ds.contentstore import ContentStore, read_note_file
+from ds.scanner import ProjectScanner, scan_directory, URGENT, BACKGROUND
+from ds.watcher import ProjectWatcher, file_signature
+from ds.notecache import NoteCache
+from ds.savewriter import SaveWriter
+from ds.searchindex import SearchIndex
+from ds.trigramindex import TrigramIndex
 import tkinter.simpledialog as tk_simpledialog
 tk.simpledialog = tk_simpledialog
 
+UNDO_MAX_STEPS = 1000
+UNDO_MAX_BYTES = 8 * 1024 * 1024
+WATCH_INTERVAL = 2.0
+NOTE_CACHE_BYTES = 32 * 1024 * 1024
+AUTOSAVE_DELAY = 1500
+
 class NoteApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Greatest Of One's Notes - .goon")
         self.root.geometry("1000x600")
         
-        self.undo_stack = Stack()
-        self.redo_stack = Stack()
+        self.undo_log = UndoLog(UNDO_MAX_STEPS, UNDO_MAX_BYTES)
+        self.applying_history = False
         
         self.root_node = TreeNode("Root", is_folder=True)
         self.current_node = None
+        self.tree_index = {}
+        self.tree_placeholders = {}
         self.project_folder = None
+        self.scanner = None
+        self.manifest = None
+        self.scan_polling = False
+        self.watcher = None
+        self.note_signature = None
+        self.note_cache = NoteCache(NOTE_CACHE_BYTES)
+        self.save_writer = SaveWriter()
+        self.save_polling = False
+        self.search_index = SearchIndex()
+        self.search_index.ready = True
+        # Search and quick-open index updates, run in order on one thread so a rename can't overtake the add before it
+        self.index_tasks = queue.Queue()
+        threading.Thread(target=self._run_index_tasks, daemon=True).start()
+        self.search_timer = None
+        self.search_result_keys = []
+        self.quick_index = TrigramIndex()
+        self.content_store = None
+        self.compress_notes = tk.BooleanVar(value=False)
+        self.quick_open_window = None
         
         self.current_file = None
         self.is_modified = False
+        self.autosave_enabled = tk.BooleanVar(value=True)
+        self.autosave_timer = None
         
-        self.gap_buffer = GapBuffer()
+        self.text_buffer = make_text_buffer()
         
         self.editing_item = None
         self.edit_entry = None
+        self.edit_entry_sync = None
         self.rename_gap_buffer = None
         self.editing_node = None
         
         self.setup_ui()
         self.bind_shortcuts()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def setup_ui(self):
         menubar = tk.Menu(self.root)
@@ -44,14 +88,17 @@ class NoteApp:
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="New Project", command=self.new_project)
         file_menu.add_command(label="Open Project", command=self.open_project)
+        file_menu.add_command(label="Quick Open...", command=self.quick_open, accelerator="Ctrl+P")
         file_menu.add_separator()
         file_menu.add_command(label="New Note", command=self.new_note)
         file_menu.add_command(label="New Folder", command=self.new_folder)
         file_menu.add_command(label="Rename", command=self.rename_item)
         file_menu.add_command(label="Save", command=self.save_note)
         file_menu.add_command(label="Save As...", command=self.save_note_as)
+        file_menu.add_checkbutton(label="Autosave", variable=self.autosave_enabled)
+        file_menu.add_checkbutton(label="Compressed Note Store", variable=self.compress_notes, command=self.toggle_content_store)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.on_close)
         
         edit_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Edit", menu=edit_menu)
@@ -82,6 +129,16 @@ class NoteApp:
         
         tk.Label(left_frame, text="Notes Structure", font=("Arial", 10, "bold")).pack(pady=5)
         
+        self.search_entry = tk.Entry(left_frame)
+        self.search_entry.pack(fill=tk.X, padx=5)
+        self.search_entry.bind('<KeyRelease>', self.on_search_change)
+        self.search_entry.bind('<Return>', lambda e: self.run_search())
+        self.search_entry.bind('<Escape>', lambda e: self.hide_search_results())
+        
+        self.search_results = tk.Listbox(left_frame, height=8)
+        self.search_results.bind('<Double-Button-1>', self.open_search_result)
+        self.search_results.bind('<Return>', self.open_search_result)
+        
         tree_scroll = tk.Scrollbar(left_frame)
         tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         
@@ -90,6 +147,7 @@ class NoteApp:
         tree_scroll.config(command=self.tree_view.yview)
         
         self.tree_view.bind('<<TreeviewSelect>>', self.on_tree_select)
+        self.tree_view.bind('<<TreeviewOpen>>', self.on_tree_open)
         self.tree_view.bind('<Button-3>', self.show_context_menu)
         self.tree_view.bind('<Double-Button-1>', lambda e: self.rename_item())
         
@@ -116,18 +174,24 @@ class NoteApp:
         self.text_editor = tk.Text(right_frame, wrap=tk.WORD, font=("Arial", 11), undo=False)
         self.text_editor.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         self.text_editor.bind('<KeyRelease>', self.on_text_change)
+        self.editor_sync = EditSync(self.text_editor, self.text_buffer, self.on_editor_edit)
         
-        self.last_saved_content = ""
         self.typing_timer = None
         
         self.status_bar = tk.Label(self.root, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
+        self.cursor_label = tk.Label(self.status_bar, text="Ln 1, Col 1", anchor=tk.E)
+        self.cursor_label.pack(side=tk.RIGHT, padx=5)
+        self.text_editor.bind('<ButtonRelease-1>', self.update_cursor_status)
+        
     def bind_shortcuts(self):
         self.root.bind('<Control-z>', lambda e: self.undo())
         self.root.bind('<Control-y>', lambda e: self.redo())
         self.root.bind('<Control-s>', lambda e: self.save_note())
         self.root.bind('<F2>', lambda e: self.rename_item())
+        self.root.bind('<Control-F>', lambda e: self.search_entry.focus_set())
+        self.root.bind('<Control-p>', lambda e: self.quick_open())
         self.root.bind('<Escape>', lambda e: self.cancel_inline_edit())
         
     
@@ -139,6 +203,8 @@ class NoteApp:
         
     def refresh_tree(self):
         self.tree_view.delete(*self.tree_view.get_children())
+        self.tree_index = {}
+        self.tree_placeholders = {}
         self._build_tree("", self.root_node)
     
     def _build_tree(self, parent_id, node):
@@ -146,26 +212,361 @@ class NoteApp:
             for child in node.children:
                 self._build_tree(parent_id, child)
         else:
-            icon = "📁" if node.is_folder else "📄"
-            display = f"{icon} {node.name}"
-            node.tree_id = self.tree_view.insert(parent_id, 'end', text=display, open=True)
+            node.tree_id = self.tree_view.insert(parent_id, 'end', text=self._tree_label(node), open=False)
+            self.tree_index[node.tree_id] = node
             
-            if node.is_folder:
-                for child in node.children:
-                    self._build_tree(node.tree_id, child)
+            if node.is_folder and (node.children or not node.children_loaded):
+                # Child rows are only created once the folder is expanded
+                placeholder = self.tree_view.insert(node.tree_id, 'end', text="Loading...")
+                self.tree_placeholders[node.tree_id] = placeholder
+    
+    def _tree_label(self, node):
+        icon = "📁" if node.is_folder else "📄"
+        return f"{icon} {node.name}"
+    
+    def _insert_tree_item(self, node):
+        parent = node.parent
+        if parent == self.root_node:
+            self._build_tree("", node)
+        elif parent.tree_id in self.tree_placeholders:
+            self._expand_folder(parent)
+        else:
+            self._build_tree(parent.tree_id, node)
+            self.tree_view.item(parent.tree_id, open=True)
+    
+    def _relabel_tree_item(self, node):
+        if node.tree_id:
+            self.tree_view.item(node.tree_id, text=self._tree_label(node))
+    
+    def _remove_tree_item(self, node):
+        if node.tree_id:
+            self.tree_view.delete(node.tree_id)
+        self._unindex_subtree(node)
     
-    def find_node_by_tree_id(self, tree_id, node=None):
-        if node is None:
-            node = self.root_node
+    def find_node_by_tree_id(self, tree_id):
+        return self.tree_index.get(tree_id)
+    
+    def _unindex_subtree(self, node):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self.tree_index.pop(current.tree_id, None)
+            self.tree_placeholders.pop(current.tree_id, None)
+            current.tree_id = None
+            stack.extend(current.children)
+    
+    def on_tree_open(self, event):
+        node = self.find_node_by_tree_id(self.tree_view.focus())
+        if node and node.is_folder:
+            self._expand_folder(node)
+    
+    def _expand_folder(self, node):
+        placeholder = self.tree_placeholders.get(node.tree_id)
+        if placeholder is None:
+            return
         
-        if node.tree_id == tree_id:
-            return node
+        if not node.children_loaded:
+            # Rows are built by _attach_scanned once the scan comes back
+            self._start_scan(node, URGENT)
+            return
         
+        del self.tree_placeholders[node.tree_id]
+        self.tree_view.delete(placeholder)
         for child in node.children:
-            result = self.find_node_by_tree_id(tree_id, child)
-            if result:
-                return result
-        return None
+            self._build_tree(node.tree_id, child)
+        self.tree_view.item(node.tree_id, open=True)
+    
+    def _load_folder(self, node):
+        try:
+            children = scan_directory(self._get_node_path(node), self.manifest)
+        except OSError as e:
+            self.status_bar.config(text=f"Error scanning folder: {e}")
+            children = []
+        self._attach_scanned(node, children)
+        # A running scan may hold detached copies of these subfolders, whose results
+        # _attach_scanned drops, so the attached ones are queued for the background scan
+        for child in node.children:
+            if not child.children_loaded:
+                self._start_scan(child, BACKGROUND)
+    
+    def _start_scan(self, node, priority):
+        if not self.scanner:
+            self.scanner = ProjectScanner(manifest=self.manifest)
+        self.scanner.submit(node, self._get_node_path(node), priority)
+        if not self.scan_polling:
+            self.scan_polling = True
+            self.root.after(50, self._poll_scanner)
+    
+    def _poll_scanner(self):
+        scanner = self.scanner
+        if not scanner:
+            self.scan_polling = False
+            return
+        
+        for node, children, error in scanner.poll():
+            if error:
+                self.status_bar.config(text=f"Error scanning folder: {error}")
+            else:
+                self._attach_scanned(node, children)
+        
+        if scanner.is_done():
+            self.scan_polling = False
+            self.status_bar.config(text=f"Project opened: {self.project_folder} [{scanner.scanned} folders scanned]")
+            if self.manifest and not self.watcher:
+                # The manifest now matches the tree, so it is the watcher's baseline
+                self.watcher = ProjectWatcher(self.project_folder, self.manifest, WATCH_INTERVAL)
+                self.root.after(500, self._poll_watcher, self.watcher)
+        else:
+            self.status_bar.config(text=f"Scanning project... [{scanner.scanned} folders]")
+            self.root.after(50, self._poll_scanner)
+    
+    def _poll_watcher(self, watcher):
+        if watcher is not self.watcher:
+            return
+        
+        changes = watcher.poll()
+        for kind, parent_parts, name, is_folder in changes:
+            self._apply_disk_change(kind, parent_parts, name, is_folder)
+        if watcher.save_error:
+            self.status_bar.config(text=f"Could not save project manifest: {watcher.save_error}")
+            watcher.save_error = None
+        
+        self._check_note_on_disk()
+        self.root.after(500, self._poll_watcher, watcher)
+    
+    def _apply_disk_change(self, kind, parent_parts, name, is_folder):
+        parent = self.root_node
+        for part in parent_parts:
+            parent = parent.get_child(part)
+            if parent is None:
+                return
+        # Folders not scanned yet will pick the change up when they are
+        if not parent.children_loaded:
+            return
+        
+        node = parent.get_child(name)
+        if kind == "added":
+            # Changes made by the app itself show up here too and are already applied
+            if node:
+                return
+            node = TreeNode(name, is_folder=is_folder)
+            node.children_loaded = not is_folder
+            parent.add_child(node)
+            self._index_later(self.quick_index.add, node)
+            self._index_in_background(node)
+            if parent == self.root_node:
+                self._build_tree("", node)
+            elif parent.tree_id and parent.tree_id not in self.tree_placeholders:
+                self._build_tree(parent.tree_id, node)
+            self.status_bar.config(text=f"Added on disk: {node.get_path()}")
+        else:
+            if not node or node.is_folder != is_folder:
+                return
+            current = self.current_node
+            while current and current is not node:
+                current = current.parent
+            
+            self._index_later(self.search_index.remove, self._note_key(node))
+            self._index_later(self.quick_index.remove_subtree, node)
+            parent.remove_child(node)
+            self._remove_tree_item(node)
+            if current:
+                self._close_removed_note()
+            self.status_bar.config(text=f"Removed on disk: {'/'.join(parent_parts + (name,))}")
+    
+    def _close_removed_note(self):
+        if self.is_modified:
+            # Keep the text; saving writes the note back
+            messagebox.showwarning("Note Deleted", f"'{self.current_node.name}' was deleted outside the app. Save it to keep your changes.")
+            return
+        self.current_node = None
+        self.note_signature = None
+        self.text_editor.delete('1.0', tk.END)
+        self.undo_log.attach(None, "")
+        self.title_entry.delete(0, tk.END)
+    
+    def _check_note_on_disk(self):
+        if not self.current_node:
+            return
+        file_path = self._get_node_path(self.current_node)
+        # Our own save is about to change the file
+        if self.save_writer.is_pending(file_path):
+            return
+        signature = file_signature(file_path)
+        # A missing file is handled as a removal by the watcher
+        if signature is None or signature == self.note_signature:
+            return
+        
+        self.note_signature = signature
+        message = f"'{self.current_node.name}' was changed outside the app. Reload it?"
+        if self.is_modified:
+            message += " Your unsaved changes will be lost."
+        if messagebox.askyesno("Note Changed", message):
+            self.is_modified = False
+            self.load_note(self.current_node)
+    
+    def _index_in_background(self, node):
+        index = self.search_index
+        path = self._get_node_path(node)
+        if node.is_folder:
+            thread = threading.Thread(target=index.build, args=(self.project_folder, path), daemon=True)
+        else:
+            thread = threading.Thread(target=index.add_file, args=(self._note_key(node), path), daemon=True)
+        thread.start()
+    
+    def _index_later(self, method, *args):
+        self.index_tasks.put((method, args))
+    
+    def _run_index_tasks(self):
+        while True:
+            method, args = self.index_tasks.get()
+            method(*args)
+    
+    def on_search_change(self, event):
+        if self.search_timer:
+            self.root.after_cancel(self.search_timer)
+        self.search_timer = self.root.after(150, self.run_search)
+    
+    def run_search(self):
+        self.search_timer = None
+        query = self.search_entry.get().strip()
+        if not query:
+            self.hide_search_results()
+            return
+        
+        start = time.perf_counter()
+        results = self.search_index.search(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        
+        self.search_results.delete(0, tk.END)
+        self.search_result_keys = [key for key, _, _ in results]
+        for key, score, hits in results:
+            self.search_results.insert(tk.END, f"{key} ({hits})")
+        if not self.search_results.winfo_ismapped():
+            self.search_results.pack(fill=tk.X, padx=5, pady=(2, 0), after=self.search_entry)
+        
+        status = f"Search: {len(results)} notes in {elapsed:.1f} ms"
+        if not self.search_index.ready:
+            status += " (still indexing)"
+        self.status_bar.config(text=status)
+    
+    def hide_search_results(self):
+        self.search_results.pack_forget()
+        self.search_result_keys = []
+    
+    def open_search_result(self, event):
+        selection = self.search_results.curselection()
+        if selection:
+            self._reveal_path(self.search_result_keys[selection[0]].split("/"))
+    
+    def quick_open(self):
+        if self.quick_open_window:
+            self.quick_open_window.lift()
+            self.quick_open_entry.focus_set()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Quick Open")
+        window.geometry("500x320")
+        window.transient(self.root)
+        self.quick_open_window = window
+        
+        self.quick_open_entry = tk.Entry(window, font=("Arial", 12))
+        self.quick_open_entry.pack(fill=tk.X, padx=5, pady=5)
+        self.quick_open_list = tk.Listbox(window)
+        self.quick_open_list.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+        self.quick_open_nodes = []
+        
+        self.quick_open_entry.bind('<KeyRelease>', self.on_quick_open_change)
+        self.quick_open_entry.bind('<Down>', lambda e: self._move_quick_open_selection(1))
+        self.quick_open_entry.bind('<Up>', lambda e: self._move_quick_open_selection(-1))
+        self.quick_open_entry.bind('<Return>', lambda e: self.open_quick_open_selection())
+        self.quick_open_list.bind('<Double-Button-1>', lambda e: self.open_quick_open_selection())
+        window.bind('<Escape>', lambda e: self.close_quick_open())
+        window.protocol("WM_DELETE_WINDOW", self.close_quick_open)
+        self.quick_open_entry.focus_set()
+    
+    def on_quick_open_change(self, event):
+        if event.keysym in ('Up', 'Down', 'Return', 'Escape'):
+            return
+        
+        start = time.perf_counter()
+        self.quick_open_nodes = self.quick_index.search(self.quick_open_entry.get())
+        elapsed = (time.perf_counter() - start) * 1000
+        
+        self.quick_open_list.delete(0, tk.END)
+        for node in self.quick_open_nodes:
+            self.quick_open_list.insert(tk.END, "/".join(node.get_path_parts()[1:]))
+        if self.quick_open_nodes:
+            self.quick_open_list.selection_set(0)
+        self.status_bar.config(text=f"Quick open: {len(self.quick_open_nodes)} matches in {elapsed:.1f} ms")
+    
+    def _move_quick_open_selection(self, step):
+        if not self.quick_open_nodes:
+            return
+        selection = self.quick_open_list.curselection()
+        index = selection[0] + step if selection else 0
+        index = max(0, min(index, len(self.quick_open_nodes) - 1))
+        self.quick_open_list.selection_clear(0, tk.END)
+        self.quick_open_list.selection_set(index)
+        self.quick_open_list.see(index)
+    
+    def open_quick_open_selection(self):
+        selection = self.quick_open_list.curselection()
+        if not selection:
+            return
+        node = self.quick_open_nodes[selection[0]]
+        self.close_quick_open()
+        self._reveal_path(node.get_path_parts()[1:])
+    
+    def close_quick_open(self):
+        if self.quick_open_window:
+            self.quick_open_window.destroy()
+            self.quick_open_window = None
+            self.quick_open_nodes = []
+    
+    def _reveal_path(self, parts):
+        """Load and expand the folders down to `parts` and select the node there."""
+        node = self.root_node
+        for part in parts:
+            if not node.children_loaded:
+                self._load_folder(node)
+            if node != self.root_node:
+                self._expand_folder(node)
+            node = node.get_child(part)
+            if node is None:
+                self.status_bar.config(text=f"Not found: {'/'.join(parts)}")
+                return None
+        
+        self.tree_view.see(node.tree_id)
+        self.tree_view.selection_set(node.tree_id)
+        return node
+    
+    def _attach_scanned(self, node, children):
+        # Results can arrive for folders already loaded, deleted or moved meanwhile
+        if node.children_loaded or not self._is_attached(node):
+            return
+        
+        for child in children:
+            node.add_child(child)
+            self._index_later(self.quick_index.add, child)
+        node.children_loaded = True
+        
+        if node == self.root_node:
+            for child in children:
+                self._build_tree("", child)
+        elif node.tree_id in self.tree_placeholders:
+            if not children:
+                self.tree_view.delete(self.tree_placeholders.pop(node.tree_id))
+            elif self.tree_view.tk.getboolean(self.tree_view.item(node.tree_id, 'open')):
+                self._expand_folder(node)
+    
+    def _is_attached(self, node):
+        while node != self.root_node:
+            if node.parent is None or node not in node.parent.children:
+                return False
+            node = node.parent
+        return True
     
     def on_tree_select(self, event):
         selection = self.tree_view.selection()
@@ -177,38 +578,51 @@ class NoteApp:
                 self.load_note(node)
     
     def load_note(self, node):
-        if self.current_node and self.is_modified:
-            response = messagebox.askyesnocancel("Save?", "Save changes to current note?")
-            if response is True:
-                self.save_note()
-            elif response is None:
-                return
+        if self.current_node and (self.is_modified or self._pending_title()):
+            if self.autosave_enabled.get():
+                # The title may have been edited too; autosave only ever writes the text
+                if not self._rename_from_title():
+                    return
+                self._queue_save(self.current_node)
+            else:
+                response = messagebox.askyesnocancel("Save?", "Save changes to current note?")
+                if response is True:
+                    self.save_note()
+                elif response is None:
+                    return
         
         if not self.project_folder:
             return
         
         file_path = self._get_node_path(node)
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            node.content = content
-        else:
-            node.content = ""
+        # A save still in flight is newer than the file on disk
+        content = self.save_writer.content_for(file_path)
+        self.note_signature = None if content is not None else file_signature(file_path)
+        if content is None:
+            content = self.note_cache.get(file_path, self.note_signature)
+        if content is None and os.path.exists(file_path):
+            try:
+                content = read_note_file(file_path, self.content_store)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Error", f"Failed to read note: {e}")
+                return
+            self.note_cache.put(file_path, self.note_signature, content)
+            self._index_later(self.search_index.add, self._note_key(node), content)
+        node.content = content or ""
         
         self.current_node = node
         self.title_entry.delete(0, tk.END)
         self.title_entry.insert(0, node.name.replace('.goon', ''))
         
+        self.text_buffer = make_text_buffer(len(node.content))
+        self.editor_sync.buffer = self.text_buffer
         self.text_editor.delete('1.0', tk.END)
         self.text_editor.insert('1.0', node.content)
-        
-        self.gap_buffer.set_text(node.content)
+        self.update_cursor_status()
         
         self.is_modified = False
-        self.undo_stack.clear()
-        self.redo_stack.clear()
-        self.last_saved_content = node.content
-        self.status_bar.config(text=f"Loaded: {node.get_path()} [GapBuffer: {self.gap_buffer.get_gap_info()['text_length']} chars]")
+        self.undo_log.attach(UndoJournal(self._get_journal_path(node)), node.content)
+        self.status_bar.config(text=f"Loaded: {node.get_path()} [{self.text_buffer.get_info()['engine']}: {self.text_buffer.get_text_length()} chars]")
     
     def new_note(self):
         if not self.project_folder:
@@ -224,18 +638,22 @@ class NoteApp:
             if selected_node:
                 parent_node = selected_node if selected_node.is_folder else selected_node.parent
         
+        if not parent_node.children_loaded:
+            self._load_folder(parent_node)
+        
         name = tk.simpledialog.askstring("New Note", "Enter note name:")
         if name:
             if not name.endswith('.goon'):
                 name += '.goon'
             new_note = TreeNode(name, is_folder=False, content="")
             parent_node.add_child(new_note)
+            self._index_later(self.quick_index.add, new_note)
             
             file_path = self._get_node_path(new_note)
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write("")
             
-            self.refresh_tree()
+            self._insert_tree_item(new_note)
             self.status_bar.config(text=f"Created: {name}")
     
     def new_folder(self):
@@ -252,6 +670,9 @@ class NoteApp:
             if selected_node and selected_node.is_folder:
                 parent_node = selected_node
         
+        if not parent_node.children_loaded:
+            self._load_folder(parent_node)
+        
         name = tk.simpledialog.askstring("New Folder", "Enter folder name:")
         if name:
             new_folder = TreeNode(name, is_folder=True)
@@ -260,7 +681,7 @@ class NoteApp:
             folder_path = self._get_node_path(new_folder)
             os.makedirs(folder_path, exist_ok=True)
             
-            self.refresh_tree()
+            self._insert_tree_item(new_folder)
             self.status_bar.config(text=f"Created folder: {name}")
             
     
@@ -296,10 +717,10 @@ class NoteApp:
             current_name = current_name[:-5]
         
         self.rename_gap_buffer = GapBuffer()
-        self.rename_gap_buffer.set_text(current_name)
         
         self.edit_entry = tk.Entry(self.tree_view, font=("Arial", 9))
         self.edit_entry.place(x=x + 20, y=y, width=width - 20, height=height)
+        self.edit_entry_sync = EditSync(self.edit_entry, self.rename_gap_buffer)
         
         self.edit_entry.insert(0, current_name)
         self.edit_entry.selection_range(0, tk.END)
@@ -317,10 +738,7 @@ class NoteApp:
         if not self.edit_entry or not self.rename_gap_buffer:
             return
         
-        current_text = self.edit_entry.get()
         cursor_pos = self.edit_entry.index(tk.INSERT)
-        
-        self.rename_gap_buffer.set_text(current_text)
         self.rename_gap_buffer.move_cursor(cursor_pos)
         
         gap_info = self.rename_gap_buffer.get_gap_info()
@@ -340,39 +758,50 @@ class NoteApp:
                 new_name += '.goon'
             
             if self.editing_node.parent:
-                for sibling in self.editing_node.parent.children:
-                    if sibling != self.editing_node and sibling.name == new_name:
-                        messagebox.showerror("Error", f"An item with name '{new_name}' already exists!")
-                        self.cancel_inline_edit()
-                        return
+                siblings = self.editing_node.parent.get_children(new_name)
+                if any(sibling is not self.editing_node for sibling in siblings):
+                    messagebox.showerror("Error", f"An item with name '{new_name}' already exists!")
+                    self.cancel_inline_edit()
+                    return
             
             old_name = self.editing_node.name
+            old_key = self._note_key(self.editing_node)
             old_path = self._get_node_path(self.editing_node)
+            old_journal_path = self._get_journal_path(self.editing_node)
             
             self.editing_node.name = new_name
             new_path = self._get_node_path(self.editing_node)
             
             try:
+                self.save_writer.flush()
                 if os.path.exists(old_path):
                     os.rename(old_path, new_path)
+                if not self.editing_node.is_folder and os.path.exists(old_journal_path):
+                    os.rename(old_journal_path, self._get_journal_path(self.editing_node))
+                self._index_later(self.search_index.rename, old_key, self._note_key(self.editing_node))
+                self._index_later(self.quick_index.update_subtree, self.editing_node)
+                if self.current_node and self.undo_log.journal:
+                    self.undo_log.journal.path = self._get_journal_path(self.current_node)
                 
                 if self.current_node == self.editing_node:
                     self.title_entry.delete(0, tk.END)
                     self.title_entry.insert(0, new_name.replace('.goon', ''))
                 
+                self._relabel_tree_item(self.editing_node)
                 self.status_bar.config(text=f"Renamed: '{old_name}' → '{new_name}' [GapBuffer used]")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to rename: {e}")
                 self.editing_node.name = old_name
         
         self.cancel_inline_edit()
-        self.refresh_tree()
 
     def cancel_inline_edit(self):
         """Cancel inline editing"""
         if self.edit_entry:
+            self.edit_entry_sync.detach()
             self.edit_entry.destroy()
             self.edit_entry = None
+            self.edit_entry_sync = None
         
         self.editing_item = None
         self.editing_node = None
@@ -394,20 +823,31 @@ class NoteApp:
                 if response:
                     item_path = self._get_node_path(node)
                     try:
+                        self.save_writer.flush()
                         if node.is_folder:
                             shutil.rmtree(item_path)
                         else:
                             os.remove(item_path)
+                            UndoJournal(self._get_journal_path(node)).delete()
                     except Exception as e:
                         messagebox.showerror("Error", f"Failed to delete: {e}")
                         return
                     
+                    self._index_later(self.search_index.remove, self._note_key(node))
+                    self._index_later(self.quick_index.remove_subtree, node)
                     node.parent.remove_child(node)
-                    if self.current_node == node:
+                    self._remove_tree_item(node)
+                    # The open note may be inside a deleted folder
+                    current = self.current_node
+                    while current and current is not node:
+                        current = current.parent
+                    if current:
                         self.current_node = None
+                        self.note_signature = None
                         self.text_editor.delete('1.0', tk.END)
+                        self.undo_log.attach(None, "")
                         self.title_entry.delete(0, tk.END)
-                    self.refresh_tree()
+                        self.is_modified = False
                     self.status_bar.config(text=f"Deleted: {node.name}")
     
     def save_note(self):
@@ -416,37 +856,100 @@ class NoteApp:
             return
         
         if self.current_node and not self.current_node.is_folder:
-            content = self.gap_buffer.get_text()
-            self.current_node.content = content
-            
-            new_name = self.title_entry.get().strip()
-            if new_name and not new_name.endswith('.goon'):
-                new_name += '.goon'
-            
-            old_path = self._get_node_path(self.current_node)
-            
-            if new_name and new_name != self.current_node.name:
-                self.current_node.name = new_name
-                new_path = self._get_node_path(self.current_node)
-                try:
-                    os.rename(old_path, new_path)
-                    old_path = new_path
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to rename: {e}")
-                    return
+            if not self._rename_from_title():
+                return
             
-            try:
-                with open(old_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                self.is_modified = False
-                self.refresh_tree()
-                gap_info = self.gap_buffer.get_gap_info()
-                self.status_bar.config(text=f"Saved: {self.current_node.name} [GapBuffer: {gap_info['text_length']} chars, gap size: {gap_info['gap_size']}]")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save: {e}")
+            self._queue_save(self.current_node)
+            self.status_bar.config(text=f"Saving: {self.current_node.name}...")
         else:
             messagebox.showwarning("No Note", "No note selected to save")
     
+    def _pending_title(self):
+        """File name the title entry asks for, or None if it matches the open note."""
+        new_name = self.title_entry.get().strip()
+        if new_name and not new_name.endswith('.goon'):
+            new_name += '.goon'
+        if new_name and new_name != self.current_node.name:
+            return new_name
+        return None
+    
+    def _rename_from_title(self):
+        new_name = self._pending_title()
+        if not new_name:
+            return True
+        
+        old_name = self.current_node.name
+        old_path = self._get_node_path(self.current_node)
+        old_key = self._note_key(self.current_node)
+        self.current_node.name = new_name
+        new_path = self._get_node_path(self.current_node)
+        try:
+            self.save_writer.flush()
+            os.rename(old_path, new_path)
+        except Exception as e:
+            self.current_node.name = old_name
+            messagebox.showerror("Error", f"Failed to rename: {e}")
+            return False
+        
+        self._index_later(self.search_index.rename, old_key, self._note_key(self.current_node))
+        self._index_later(self.quick_index.update_subtree, self.current_node)
+        try:
+            self.undo_log.journal.move(self._get_journal_path(self.current_node))
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to move undo history: {e}")
+        self._relabel_tree_item(self.current_node)
+        return True
+    
+    def _queue_save(self, node):
+        # Hands the editor text for `node` to the writer; nothing here waits on disk
+        content = self.text_buffer.get_text()
+        node.content = content
+        self.save_writer.submit(self._get_node_path(node), content)
+        self._index_later(self.search_index.add, self._note_key(node), content)
+        self._start_save_polling()
+        self.is_modified = False
+        try:
+            self.undo_log.save(content)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save undo history: {e}")
+    
+    def autosave_note(self):
+        self.autosave_timer = None
+        if self.autosave_enabled.get() and self.current_node and self.is_modified:
+            self._queue_save(self.current_node)
+    
+    def _start_save_polling(self):
+        if not self.save_polling:
+            self.save_polling = True
+            self.root.after(100, self._poll_save_writer)
+    
+    def _poll_save_writer(self):
+        for path, content, signature, error in self.save_writer.poll():
+            is_current = self.current_node is not None and self._get_node_path(self.current_node) == path
+            if error:
+                if is_current:
+                    self.is_modified = True
+                messagebox.showerror("Error", f"Failed to save: {error}")
+                continue
+            
+            self.note_cache.put(path, signature, content)
+            if is_current:
+                self.note_signature = signature
+            self.status_bar.config(text=f"Saved: {os.path.basename(path)} [{len(content)} chars]")
+        
+        if self.save_writer.has_pending():
+            self.root.after(100, self._poll_save_writer)
+        else:
+            self.save_polling = False
+    
+    def on_close(self):
+        if self.autosave_enabled.get() and self.current_node and (self.is_modified or self._pending_title()):
+            self._rename_from_title()
+            self._queue_save(self.current_node)
+        # Let queued saves land before the writer thread goes away with the process
+        self.save_writer.flush()
+        self.root.quit()
+    
     def save_note_as(self):
         content = self.text_editor.get('1.0', tk.END).strip()
         if content:
@@ -462,8 +965,21 @@ class NoteApp:
     def new_project(self):
         folder_path = filedialog.askdirectory(title="Select folder for new project")
         if folder_path:
+            if self.scanner:
+                self.scanner.stop()
+                self.scanner = None
+            if self.watcher:
+                self.watcher.stop()
+                self.watcher = None
+            self.manifest = None
             self.project_folder = folder_path
+            self._open_content_store()
+            self.search_index.cancelled = True
+            self.search_index = SearchIndex(self.content_store)
+            self.search_index.ready = True
             self.root_node = TreeNode("Root", is_folder=True)
+            self.note_cache.clear()
+            self.quick_index = TrigramIndex()
             self.current_node = None
             self.text_editor.delete('1.0', tk.END)
             self.title_entry.delete(0, tk.END)
@@ -473,37 +989,80 @@ class NoteApp:
     def open_project(self):
         folder_path = filedialog.askdirectory(title="Select project folder")
         if folder_path:
+            if self.scanner:
+                self.scanner.stop()
+                self.scanner = None
+            if self.watcher:
+                self.watcher.stop()
+                self.watcher = None
             self.project_folder = folder_path
+            self._open_content_store()
+            # Folders unchanged since the last visit are rebuilt from the manifest,
+            # which the first scanner thread to need it reads in
+            self.manifest = ProjectManifest(folder_path)
             self.root_node = TreeNode("Root", is_folder=True)
-            self._scan_folder(folder_path, self.root_node)
+            self.note_cache.clear()
+            self.quick_index = TrigramIndex()
+            self.root_node.children_loaded = False
             self.current_node = None
             self.text_editor.delete('1.0', tk.END)
             self.title_entry.delete(0, tk.END)
             self.refresh_tree()
-            self.status_bar.config(text=f"Project opened: {folder_path}")
+            self._start_scan(self.root_node, URGENT)
+            self.search_index.cancelled = True
+            self.search_index = SearchIndex(self.content_store)
+            threading.Thread(target=self.search_index.build, args=(folder_path,), daemon=True).start()
+            self.status_bar.config(text=f"Scanning project: {folder_path}")
+    
+    def _open_content_store(self):
+        # Queued saves belong to the previous project and its encoding
+        self.save_writer.flush()
+        self.content_store = ContentStore(os.path.join(self.project_folder, CACHE_DIR, "objects"))
+        enabled = os.path.exists(self._content_store_marker())
+        self.compress_notes.set(enabled)
+        self.save_writer.encode = self.content_store.pointer_for if enabled else None
+        if self.content_store.exists():
+            # Each autosave of a changed note leaves a blob behind; drop the ones nothing points to
+            threading.Thread(target=self.content_store.collect_garbage, args=(self.project_folder,), daemon=True).start()
     
-    def _scan_folder(self, folder_path, parent_node):
+    def _content_store_marker(self):
+        return os.path.join(self.project_folder, CACHE_DIR, "compress")
+    
+    def toggle_content_store(self):
+        if not self.project_folder:
+            self.compress_notes.set(False)
+            messagebox.showwarning("No Project", "Please create or open a project first")
+            return
+        
+        enabled = self.compress_notes.get()
+        marker = self._content_store_marker()
         try:
-            items = sorted(os.listdir(folder_path))
-            for item in items:
-                item_path = os.path.join(folder_path, item)
-                if os.path.isdir(item_path):
-                    folder_node = TreeNode(item, is_folder=True)
-                    parent_node.add_child(folder_node)
-                    self._scan_folder(item_path, folder_node)
-                elif item.endswith('.goon'):
-                    note_node = TreeNode(item, is_folder=False)
-                    parent_node.add_child(note_node)
-        except Exception as e:
-            self.status_bar.config(text=f"Error scanning folder: {e}")
+            if enabled:
+                os.makedirs(self.content_store.path, exist_ok=True)
+                with open(marker, 'w', encoding='utf-8'):
+                    pass
+            elif os.path.exists(marker):
+                os.remove(marker)
+        except OSError as e:
+            self.compress_notes.set(not enabled)
+            messagebox.showerror("Error", f"Failed to change note storage: {e}")
+            return
+        
+        # Notes switch format as they are saved; existing pointers are read either way
+        self.save_writer.flush()
+        self.save_writer.encode = self.content_store.pointer_for if enabled else None
+        self.status_bar.config(text="Notes will be saved to the compressed store" if enabled else "Notes will be saved as plain text")
     
     def _get_node_path(self, node):
-        path_parts = []
-        current = node
-        while current and current != self.root_node:
-            path_parts.insert(0, current.name)
-            current = current.parent
-        return os.path.join(self.project_folder, *path_parts)
+        # Drop the root's own name; the cached parts start at the root node
+        return os.path.join(self.project_folder, *node.get_path_parts()[1:])
+    
+    def _note_key(self, node):
+        return "/".join(node.get_path_parts()[1:])
+    
+    def _get_journal_path(self, node):
+        folder, name = os.path.split(self._get_node_path(node))
+        return os.path.join(folder, f".{name}.undo")
     
 
     
@@ -511,56 +1070,77 @@ class NoteApp:
         if self.current_node and not self.is_modified:
             self.is_modified = True
         
-        current_text = self.text_editor.get('1.0', tk.END).strip()
-        self.gap_buffer.set_text(current_text)
+        self.update_cursor_status()
         
         if self.typing_timer:
             self.root.after_cancel(self.typing_timer)
         
         self.typing_timer = self.root.after(500, self.save_to_undo_stack)
     
+    def update_cursor_status(self, event=None):
+        line, column = map(int, self.text_editor.index(tk.INSERT).split('.'))
+        self.cursor_label.config(text=f"Ln {line}, Col {column + 1} / {self.text_buffer.line_count()} lines")
+    
+    def on_editor_edit(self, offset, removed, inserted):
+        if not self.applying_history:
+            self.undo_log.record(offset, removed, inserted)
+        
+        # Restarted on every edit, so the note is saved once typing pauses
+        if self.autosave_timer:
+            self.root.after_cancel(self.autosave_timer)
+        self.autosave_timer = self.root.after(AUTOSAVE_DELAY, self.autosave_note)
+    
     def save_to_undo_stack(self):
-        current_content = self.text_editor.get('1.0', tk.END).strip()
-        
-        if current_content != self.last_saved_content:
-            self.undo_stack.push(self.last_saved_content)
-            self.last_saved_content = current_content
-            self.redo_stack.clear()
+        self.undo_log.commit()
     
     def on_content_change(self, event):
         if self.current_node:
             self.is_modified = True
     
     def undo(self):
-        if not self.undo_stack.is_empty():
-            current_content = self.text_editor.get('1.0', tk.END).strip()
-            self.redo_stack.push(current_content)
-            
-            previous_content = self.undo_stack.pop()
+        group = self.undo_log.undo()
+        if group:
+            for edit in reversed(group):
+                self._apply_edit(edit.offset, edit.inserted, edit.removed)
             
-            self.text_editor.delete('1.0', tk.END)
-            self.text_editor.insert('1.0', previous_content)
-            
-            self.last_saved_content = previous_content
             self.is_modified = True
             
-            self.status_bar.config(text=f"Undo (Stack: {len(self.undo_stack.items)})")
+            self.status_bar.config(text=f"Undo (Stack: {len(self.undo_log.undo_stack.items)}, {self._format_bytes(self.undo_log.get_footprint())})")
         else:
             self.status_bar.config(text="Nothing to undo")
     
     def redo(self):
-        if not self.redo_stack.is_empty():
-            current_content = self.text_editor.get('1.0', tk.END).strip()
-            self.undo_stack.push(current_content)
-            
-            next_content = self.redo_stack.pop()
-            
-            self.text_editor.delete('1.0', tk.END)
-            self.text_editor.insert('1.0', next_content)
+        group = self.undo_log.redo()
+        if group:
+            for edit in group:
+                self._apply_edit(edit.offset, edit.removed, edit.inserted)
             
-            self.last_saved_content = next_content
             self.is_modified = True
             
-            self.status_bar.config(text=f"Redo (Stack: {len(self.redo_stack.items)})")
+            self.status_bar.config(text=f"Redo (Stack: {len(self.undo_log.redo_stack.items)}, {self._format_bytes(self.undo_log.get_footprint())})")
         else:
-            self.status_bar.config(text="Nothing to redo")
\ No newline at end of file
+            self.status_bar.config(text="Nothing to redo")
+    
+    def _format_bytes(self, size):
+        if size < 1024:
+            return f"{size} B"
+        if size < 1024 * 1024:
+            return f"{size / 1024:.1f} KB"
+        return f"{size / (1024 * 1024):.1f} MB"
+    
+    def _apply_edit(self, offset, old_text, new_text):
+        start = self.editor_sync.index(offset)
+        end = self.editor_sync.index(offset + len(old_text))
+        
+        self.applying_history = True
+        try:
+            if old_text:
+                self.text_editor.delete(start, end)
+            if new_text:
+                self.text_editor.insert(start, new_text)
+        finally:
+            self.applying_history = False
+        
+        self.text_editor.mark_set(tk.INSERT, start)
+        self.text_editor.see(tk.INSERT)
+        self.update_cursor_status()
@@ -1,34 +1,45 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import json
+import os
+import uuid
 import tkinter.simpledialog as tk_simpledialog
 
-from ds.stack import Stack
+from ds.undolog import UndoLog, UndoJournal
 from ds.treenode import TreeNode
 from ds.gapbuffer import GapBuffer
+from ds.textbuffer import make_text_buffer
+from ds.editsync import EditSync
 import ds.converter as conv
 
 tk.simpledialog = tk_simpledialog
 
+UNDO_MAX_STEPS = 1000
+UNDO_MAX_BYTES = 8 * 1024 * 1024
+
 class NoteApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Greatest Of One's Notes - .goon")
         self.root.geometry("1000x600")
         
-        self.undo_stack = Stack()
-        self.redo_stack = Stack()
+        self.undo_log = UndoLog(UNDO_MAX_STEPS, UNDO_MAX_BYTES)
+        self.applying_history = False
         
         self.root_node = TreeNode("Root", is_folder=False)
         self.current_node = None
+        self.tree_index = {}
         self.project_path = None
+        # Set when the project is a binary container; note bodies are read from it on demand
+        self.project_file = None
         
         self.is_modified = False
         self.project_modified = False
         
-        self.gap_buffer = GapBuffer()
+        self.text_buffer = make_text_buffer()
         self.editing_item = None
         self.edit_entry = None
+        self.edit_entry_sync = None
         self.rename_gap_buffer = None
         self.editing_node = None
         
@@ -113,13 +124,17 @@ class NoteApp:
         self.text_editor = tk.Text(right_frame, wrap=tk.WORD, font=("Arial", 11), undo=False)
         self.text_editor.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         self.text_editor.bind('<KeyRelease>', self.on_text_change)
+        self.editor_sync = EditSync(self.text_editor, self.text_buffer, self.on_editor_edit)
         
-        self.last_saved_content = ""
         self.typing_timer = None
         
         self.status_bar = tk.Label(self.root, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
+        self.cursor_label = tk.Label(self.status_bar, text="Ln 1, Col 1", anchor=tk.E)
+        self.cursor_label.pack(side=tk.RIGHT, padx=5)
+        self.text_editor.bind('<ButtonRelease-1>', self.update_cursor_status)
+        
     def bind_shortcuts(self):
         self.root.bind('<Control-z>', lambda e: self.undo())
         self.root.bind('<Control-y>', lambda e: self.redo())
@@ -137,35 +152,50 @@ class NoteApp:
         
     def refresh_tree(self):
         self.tree_view.delete(*self.tree_view.get_children())
+        self.tree_index = {}
         self._build_tree("", self.root_node)
     
     def _build_tree(self, parent_id, node):
+        # Root node - display its children
         if node == self.root_node:
-            # Root node - display its children
-            for child in node.children:
-                self._build_tree(parent_id, child)
+            stack = [(parent_id, child) for child in reversed(list(node.children))]
         else:
-            # All nodes are notes (no folders)
-            icon = "📄"
-            display = f"{icon} {node.name}"
-            node.tree_id = self.tree_view.insert(parent_id, 'end', text=display, open=True)
-            
-            # Recursively add children
-            for child in node.children:
-                self._build_tree(node.tree_id, child)
+            stack = [(parent_id, node)]
+        
+        # An explicit stack, so deeply nested notes don't hit the recursion limit
+        while stack:
+            parent_id, node = stack.pop()
+            node.tree_id = self.tree_view.insert(parent_id, 'end', text=self._tree_label(node), open=True)
+            self.tree_index[node.tree_id] = node
+            stack.extend((node.tree_id, child) for child in reversed(list(node.children)))
+    
+    def _tree_label(self, node):
+        icon = "📄"
+        return f"{icon} {node.name}"
+    
+    def _insert_tree_item(self, node):
+        parent_id = "" if node.parent == self.root_node else node.parent.tree_id
+        self._build_tree(parent_id, node)
     
-    def find_node_by_tree_id(self, tree_id, node=None):
-        if node is None:
-            node = self.root_node
-        
-        if node.tree_id == tree_id:
-            return node
-        
-        for child in node.children:
-            result = self.find_node_by_tree_id(tree_id, child)
-            if result:
-                return result
-        return None
+    def _relabel_tree_item(self, node):
+        if node.tree_id:
+            self.tree_view.item(node.tree_id, text=self._tree_label(node))
+    
+    def _remove_tree_item(self, node):
+        if node.tree_id:
+            self.tree_view.delete(node.tree_id)
+        self._unindex_subtree(node)
+    
+    def find_node_by_tree_id(self, tree_id):
+        return self.tree_index.get(tree_id)
+    
+    def _unindex_subtree(self, node):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self.tree_index.pop(current.tree_id, None)
+            current.tree_id = None
+            stack.extend(current.children)
     
     def on_tree_select(self, event):
         selection = self.tree_view.selection()
@@ -184,20 +214,28 @@ class NoteApp:
             elif response is None:
                 return
         
+        if self.project_file:
+            try:
+                content = self.project_file.read_content(node)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Error", f"Failed to read note: {e}")
+                return
+        else:
+            content = node.content
+        
         self.current_node = node
         self.title_entry.delete(0, tk.END)
         self.title_entry.insert(0, node.name)
         
+        self.text_buffer = make_text_buffer(len(content))
+        self.editor_sync.buffer = self.text_buffer
         self.text_editor.delete('1.0', tk.END)
-        self.text_editor.insert('1.0', node.content)
-        
-        self.gap_buffer.set_text(node.content)
+        self.text_editor.insert('1.0', content)
+        self.update_cursor_status()
         
         self.is_modified = False
-        self.undo_stack.clear()
-        self.redo_stack.clear()
-        self.last_saved_content = node.content
-        self.status_bar.config(text=f"Loaded: {node.get_path()} [GapBuffer: {self.gap_buffer.get_gap_info()['text_length']} chars]")
+        self.undo_log.attach(UndoJournal(self._get_journal_path(node)), content)
+        self.status_bar.config(text=f"Loaded: {node.get_path()} [{self.text_buffer.get_info()['engine']}: {self.text_buffer.get_text_length()} chars]")
     
     def new_note(self):
         """Create a new note as a sibling of the selected note, or as a root child if none selected"""
@@ -220,9 +258,10 @@ class NoteApp:
             # Create new note (is_folder=False)
             new_note = TreeNode(name, is_folder=False, content="")
             parent_node.add_child(new_note)
+            self._mark_dirty(new_note)
             
             self.project_modified = True
-            self.refresh_tree()
+            self._insert_tree_item(new_note)
             self.status_bar.config(text=f"Created note: {name}")
     
     def new_child_note(self):
@@ -246,9 +285,10 @@ class NoteApp:
             # Create new note (is_folder=False)
             new_note = TreeNode(name, is_folder=False, content="")
             parent_node.add_child(new_note)
+            self._mark_dirty(new_note)
             
             self.project_modified = True
-            self.refresh_tree()
+            self._insert_tree_item(new_note)
             self.status_bar.config(text=f"Created child note: {name} under {parent_node.name}")
     
     def delete_item(self):
@@ -263,13 +303,16 @@ class NoteApp:
                 response = messagebox.askyesno("Delete", f"Delete '{node.name}'?")
                 if response:
                     node.parent.remove_child(node)
+                    if self.project_file:
+                        self.project_file.mark_removed(node)
+                    self._remove_tree_item(node)
                     if self.current_node == node:
                         self.current_node = None
                         self.text_editor.delete('1.0', tk.END)
+                        self.undo_log.attach(None, "")
                         self.title_entry.delete(0, tk.END)
                     
                     self.project_modified = True
-                    self.refresh_tree()
                     self.status_bar.config(text=f"Deleted: {node.name}")
     
     def save_note(self):
@@ -278,21 +321,27 @@ class NoteApp:
             return
         
         if self.current_node:
-            content = self.gap_buffer.get_text()
+            content = self.text_buffer.get_text()
             self.current_node.content = content
+            self._mark_dirty(self.current_node)
             
             new_name = self.title_entry.get().strip()
             
             if new_name and new_name != self.current_node.name:
                 self.current_node.name = new_name
+                self._relabel_tree_item(self.current_node)
                 self.project_modified = True
             
+            try:
+                self.undo_log.save(content)
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to write undo journal: {e}")
+            
             self.is_modified = False
             self.project_modified = True
-            self.refresh_tree()
             
-            gap_info = self.gap_buffer.get_gap_info()
-            self.status_bar.config(text=f"Saved note: {self.current_node.name} [GapBuffer: {gap_info['text_length']} chars, gap size: {gap_info['gap_size']}]")
+            buffer_info = self.text_buffer.get_info()
+            self.status_bar.config(text=f"Saved note: {self.current_node.name} [{buffer_info['engine']}: {buffer_info['text_length']} chars]")
         else:
             messagebox.showwarning("No Note", "No note selected to save")
     
@@ -302,7 +351,10 @@ class NoteApp:
             return
         
         try:
-            conv.save_tree_to_my(self.project_path, self.root_node)
+            if self.project_file:
+                self.project_file.save(self.root_node)
+            else:
+                conv.save_tree_to_my(self.project_path, self.root_node)
             self.project_modified = False
             self.status_bar.config(text=f"Project saved: {self.project_path}")
         except Exception as e:
@@ -315,15 +367,17 @@ class NoteApp:
             title="Create a new project"
         )
         if filepath:
+            self._close_project_file()
             self.project_path = filepath
-            self.root_node = TreeNode("Root", is_folder=False)
             self.current_node = None
             self.text_editor.delete('1.0', tk.END)
             self.title_entry.delete(0, tk.END)
-            self.refresh_tree()
             
-            # Save empty project
-            conv.save_tree_to_my(self.project_path, self.root_node)
+            # New projects use the binary container
+            conv.save_tree_to_binary(self.project_path, TreeNode("Root", is_folder=False))
+            self.project_file = conv.BinaryProject(self.project_path)
+            self.root_node = self.project_file.open()
+            self.refresh_tree()
             self.project_modified = False
             
             self.status_bar.config(text=f"New project created: {filepath}")
@@ -336,8 +390,13 @@ class NoteApp:
         )
         if filepath:
             try:
+                self._close_project_file()
                 self.project_path = filepath
-                self.root_node = conv.load_tree_from_my(filepath)
+                if conv.is_binary_file(filepath):
+                    self.project_file = conv.BinaryProject(filepath)
+                    self.root_node = self.project_file.open()
+                else:
+                    self.root_node = conv.load_tree_from_my(filepath)
                 self.current_node = None
                 self.text_editor.delete('1.0', tk.END)
                 self.title_entry.delete(0, tk.END)
@@ -347,6 +406,23 @@ class NoteApp:
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to open project: {e}")
     
+    def _mark_dirty(self, node):
+        # Binary projects journal only the nodes marked here on the next save_project
+        if self.project_file:
+            self.project_file.mark_dirty(node)
+    
+    def _close_project_file(self):
+        if self.project_file:
+            self.project_file.close()
+            self.project_file = None
+    
+    def _get_journal_path(self, node):
+        # Keyed by the node's uid, so renames and same-named siblings don't share or orphan a journal.
+        # A new uid reaches the project file with the save_note that first writes the journal.
+        if node.uid is None:
+            node.uid = uuid.uuid4().hex
+        return os.path.join(self.project_path + ".undo", f"{node.uid}.undo")
+    
     def exit_app(self):
         if self.project_modified or self.is_modified:
             response = messagebox.askyesnocancel("Save?", "Save changes before exit?")
@@ -362,59 +438,75 @@ class NoteApp:
         if self.current_node and not self.is_modified:
             self.is_modified = True
         
-        current_text = self.text_editor.get('1.0', tk.END).strip()
-        self.gap_buffer.set_text(current_text)
+        self.update_cursor_status()
         
         if self.typing_timer:
             self.root.after_cancel(self.typing_timer)
         
         self.typing_timer = self.root.after(500, self.save_to_undo_stack)
     
+    def update_cursor_status(self, event=None):
+        line, column = map(int, self.text_editor.index(tk.INSERT).split('.'))
+        self.cursor_label.config(text=f"Ln {line}, Col {column + 1} / {self.text_buffer.line_count()} lines")
+    
+    def on_editor_edit(self, offset, removed, inserted):
+        if not self.applying_history:
+            self.undo_log.record(offset, removed, inserted)
+    
     def save_to_undo_stack(self):
-        current_content = self.text_editor.get('1.0', tk.END).strip()
-        
-        if current_content != self.last_saved_content:
-            self.undo_stack.push(self.last_saved_content)
-            self.last_saved_content = current_content
-            self.redo_stack.clear()
+        self.undo_log.commit()
     
     def on_content_change(self, event):
         if self.current_node:
             self.is_modified = True
     
     def undo(self):
-        if not self.undo_stack.is_empty():
-            current_content = self.text_editor.get('1.0', tk.END).strip()
-            self.redo_stack.push(current_content)
-            
-            previous_content = self.undo_stack.pop()
-            
-            self.text_editor.delete('1.0', tk.END)
-            self.text_editor.insert('1.0', previous_content)
+        group = self.undo_log.undo()
+        if group:
+            for edit in reversed(group):
+                self._apply_edit(edit.offset, edit.inserted, edit.removed)
             
-            self.last_saved_content = previous_content
             self.is_modified = True
             
-            self.status_bar.config(text=f"Undo (Stack: {len(self.undo_stack.items)})")
+            self.status_bar.config(text=f"Undo (Stack: {len(self.undo_log.undo_stack.items)}, {self._format_bytes(self.undo_log.get_footprint())})")
         else:
             self.status_bar.config(text="Nothing to undo")
     
     def redo(self):
-        if not self.redo_stack.is_empty():
-            current_content = self.text_editor.get('1.0', tk.END).strip()
-            self.undo_stack.push(current_content)
+        group = self.undo_log.redo()
+        if group:
+            for edit in group:
+                self._apply_edit(edit.offset, edit.removed, edit.inserted)
             
-            next_content = self.redo_stack.pop()
-            
-            self.text_editor.delete('1.0', tk.END)
-            self.text_editor.insert('1.0', next_content)
-            
-            self.last_saved_content = next_content
             self.is_modified = True
             
-            self.status_bar.config(text=f"Redo (Stack: {len(self.redo_stack.items)})")
+            self.status_bar.config(text=f"Redo (Stack: {len(self.undo_log.redo_stack.items)}, {self._format_bytes(self.undo_log.get_footprint())})")
         else:
             self.status_bar.config(text="Nothing to redo")
+    
+    def _format_bytes(self, size):
+        if size < 1024:
+            return f"{size} B"
+        if size < 1024 * 1024:
+            return f"{size / 1024:.1f} KB"
+        return f"{size / (1024 * 1024):.1f} MB"
+    
+    def _apply_edit(self, offset, old_text, new_text):
+        start = self.editor_sync.index(offset)
+        end = self.editor_sync.index(offset + len(old_text))
+        
+        self.applying_history = True
+        try:
+            if old_text:
+                self.text_editor.delete(start, end)
+            if new_text:
+                self.text_editor.insert(start, new_text)
+        finally:
+            self.applying_history = False
+        
+        self.text_editor.mark_set(tk.INSERT, start)
+        self.text_editor.see(tk.INSERT)
+        self.update_cursor_status()
             
     def rename_item(self):
         if not self.project_path:
@@ -446,10 +538,10 @@ class NoteApp:
         current_name = node.name
         
         self.rename_gap_buffer = GapBuffer()
-        self.rename_gap_buffer.set_text(current_name)
         
         self.edit_entry = tk.Entry(self.tree_view, font=("Arial", 9))
         self.edit_entry.place(x=x + 20, y=y, width=width - 20, height=height)
+        self.edit_entry_sync = EditSync(self.edit_entry, self.rename_gap_buffer)
         
         self.edit_entry.insert(0, current_name)
         self.edit_entry.selection_range(0, tk.END)
@@ -467,14 +559,12 @@ class NoteApp:
         if not self.edit_entry or not self.rename_gap_buffer:
             return
         
-        current_text = self.edit_entry.get()
         cursor_pos = self.edit_entry.index(tk.INSERT)
-        
-        self.rename_gap_buffer.set_text(current_text)
         self.rename_gap_buffer.move_cursor(cursor_pos)
         
         gap_info = self.rename_gap_buffer.get_gap_info()
-        self.status_bar.config(text=f"Editing: '{gap_info['text'][:30]}...' [Len: {gap_info['text_length']}, Gap: [{gap_info['gap_start']}:{gap_info['gap_end']}], Size: {gap_info['gap_size']}]")
+        text_preview = self.rename_gap_buffer.get_text()[:30]
+        self.status_bar.config(text=f"Editing: '{text_preview}...' [Len: {gap_info['text_length']}, Gap: [{gap_info['gap_start']}:{gap_info['gap_end']}], Size: {gap_info['gap_size']}]")
 
     def finish_inline_edit(self, event):
         if not self.edit_entry or not self.editing_node:
@@ -484,29 +574,32 @@ class NoteApp:
         
         if new_name:
             if self.editing_node.parent:
-                for sibling in self.editing_node.parent.children:
-                    if sibling != self.editing_node and sibling.name == new_name:
-                        messagebox.showerror("Error", f"An item with name '{new_name}' already exists!")
-                        self.cancel_inline_edit()
-                        return
+                siblings = self.editing_node.parent.get_children(new_name)
+                if any(sibling is not self.editing_node for sibling in siblings):
+                    messagebox.showerror("Error", f"An item with name '{new_name}' already exists!")
+                    self.cancel_inline_edit()
+                    return
             
             old_name = self.editing_node.name
             self.editing_node.name = new_name
+            self._mark_dirty(self.editing_node)
             
             if self.current_node == self.editing_node:
                 self.title_entry.delete(0, tk.END)
                 self.title_entry.insert(0, new_name)
             
             self.project_modified = True
+            self._relabel_tree_item(self.editing_node)
             self.status_bar.config(text=f"Renamed: '{old_name}' → '{new_name}' [GapBuffer used]")
         
         self.cancel_inline_edit()
-        self.refresh_tree()
 
     def cancel_inline_edit(self):
         if self.edit_entry:
+            self.edit_entry_sync.detach()
             self.edit_entry.destroy()
             self.edit_entry = None
+            self.edit_entry_sync = None
         
         self.editing_item = None
         self.editing_node = None
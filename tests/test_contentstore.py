@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ds.contentstore import ContentStore, POINTER_PREFIX, make_pointer, read_note_file, read_pointer
+
+
+class ContentStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.store = ContentStore(os.path.join(self.folder.name, ".goon_cache", "objects"))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write_note(self, name, text):
+        path = os.path.join(self.folder.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_pointer_round_trip(self):
+        path = self.write_note("a.goon", self.store.pointer_for("hello\nworld"))
+        self.assertEqual(read_note_file(path, self.store), "hello\nworld")
+        self.assertEqual(read_pointer(path), self.store.put("hello\nworld"))
+
+    def test_plain_note_starting_with_the_prefix(self):
+        key = self.store.put("stored")
+        texts = [
+            POINTER_PREFIX + " is how pointer files start\n",
+            POINTER_PREFIX + "../../../../etc/passwd\n",
+            make_pointer(key) + "and more text",
+            make_pointer(key.upper()),
+            make_pointer(key)[:-1],
+        ]
+        for i, text in enumerate(texts):
+            path = self.write_note(f"{i}.goon", text)
+            self.assertEqual(read_note_file(path, self.store), text)
+            self.assertIsNone(read_pointer(path))
+
+    def test_get_rejects_keys_outside_the_store(self):
+        with self.assertRaises(ValueError):
+            self.store.get("../../notes")
+
+    def test_collect_garbage_keeps_referenced_blobs(self):
+        self.write_note("kept.goon", self.store.pointer_for("kept"))
+        kept = self.store.put("kept")
+        dropped = self.store.put("dropped")
+        # Old enough to be collected
+        for key in (kept, dropped):
+            os.utime(self.store._blob_path(key), ns=(0, 0))
+        self.assertEqual(self.store.collect_garbage(self.folder.name), 1)
+        self.assertEqual(read_note_file(os.path.join(self.folder.name, "kept.goon"), self.store), "kept")
+        self.assertFalse(os.path.exists(self.store._blob_path(dropped)))
+
+
+if __name__ == "__main__":
+    unittest.main()
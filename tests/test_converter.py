@@ -0,0 +1,263 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ds.converter as conv
+from ds.treenode import TreeNode
+
+
+def make_tree(spec, name="Root"):
+    """TreeNodes from {name: content or nested dict}; dicts become folders."""
+    root = TreeNode(name, is_folder=True)
+    stack = [(root, spec)]
+    while stack:
+        node, children = stack.pop()
+        for child_name, value in children.items():
+            child = TreeNode(child_name, is_folder=isinstance(value, dict),
+                             content="" if isinstance(value, dict) else value)
+            node.add_child(child)
+            if isinstance(value, dict):
+                stack.append((child, value))
+    return root
+
+
+def read_tree(node, project=None):
+    """The {name: content or nested dict} spec of `node`'s children."""
+    spec = {}
+    for child in node.children:
+        if child.is_folder:
+            spec[child.name] = read_tree(child, project)
+        else:
+            spec[child.name] = project.read_content(child) if project else child.content
+    return spec
+
+
+SPEC = {
+    "a.goon": "first note\nwith two lines",
+    "empty.goon": "",
+    "folder": {
+        "b.goon": "second \U0001F600 note",
+        "copy.goon": "first note\nwith two lines",
+        "inner": {"c.goon": "x" * 5000},
+    },
+}
+
+
+class TokenizerTest(unittest.TestCase):
+    def setUp(self):
+        self.read_chunk = conv.READ_CHUNK
+
+    def tearDown(self):
+        conv.READ_CHUNK = self.read_chunk
+
+    def test_parse_at_every_chunk_size(self):
+        data = conv.tree_to_dict(make_tree(SPEC))
+        # Unknown keys holding numbers and nested values are skipped
+        data["children"][0]["size"] = 1.5e10
+        data["children"][0]["tags"] = [12, -0.25, {"x": [True, None]}, "s"]
+        data["version"] = 10
+        text = json.dumps(data, indent=4)
+        for chunk in range(1, 40):
+            conv.READ_CHUNK = chunk
+            root = conv.parse_tree(io.StringIO(text))
+            self.assertEqual(read_tree(root), SPEC, chunk)
+
+    def test_number_at_end_of_input(self):
+        for chunk in range(1, 8):
+            conv.READ_CHUNK = chunk
+            tokens = conv._Tokenizer(io.StringIO("[1.25e3, 17"))
+            self.assertEqual([tokens.next() for _ in range(4)],
+                             [('[', None), ('v', 1250.0), (',', None), ('v', 17)])
+
+    def test_saved_like_json_dump(self):
+        root = make_tree(SPEC)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "project.goon")
+            conv.save_tree_to_my(path, root)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), json.dumps(conv.tree_to_dict(root), indent=4))
+
+    def test_deep_tree_round_trip(self):
+        root = TreeNode("Root", is_folder=True)
+        node = root
+        for i in range(3000):
+            child = TreeNode(f"n{i}", is_folder=True)
+            node.add_child(child)
+            node = child
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "deep.goon")
+            conv.save_tree_to_my(path, root)
+            node = conv.load_tree_from_my(path)
+        depth = 0
+        while node.children:
+            node = next(iter(node.children))
+            depth += 1
+        self.assertEqual(depth, 3000)
+
+
+class BinaryProjectTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "project.goon")
+        self.projects = []
+
+    def tearDown(self):
+        for project in self.projects:
+            project.close()
+        self.folder.cleanup()
+
+    def open(self):
+        project = conv.BinaryProject(self.path)
+        self.projects.append(project)
+        return project, project.open()
+
+    def reopen(self, project):
+        project.close()
+        return self.open()
+
+    def find(self, root, path):
+        node = root
+        for part in path.split("/"):
+            node = node.get_child(part)
+        return node
+
+    def test_v2_round_trip_shares_equal_bodies(self):
+        conv.save_tree_to_binary(self.path, make_tree(SPEC))
+        self.assertTrue(conv.is_binary_file(self.path))
+        project, root = self.open()
+        self.assertIsNone(self.find(root, "a.goon").content)
+        self.assertEqual(read_tree(root, project), SPEC)
+        self.assertEqual(project.bodies[self.find(root, "a.goon")][:2],
+                         project.bodies[self.find(root, "folder/copy.goon")][:2])
+
+    def test_v1_file_is_read(self):
+        bodies = [b"", "café".encode("utf-8"), b"", b"plain"]
+        nodes = [["Root", True, 2], ["a.goon", False, 0], ["f", True, 1], ["b.goon", False, 0]]
+        header = b""
+        # Offsets count from the start of the file, so they depend on the header's own size
+        while True:
+            size = len(header)
+            offset = conv.BINARY_PREFIX.size + size
+            entries = []
+            for entry, body in zip(nodes, bodies):
+                entries.append(entry + [offset, len(body)])
+                offset += len(body)
+            header = json.dumps({"version": 1, "nodes": entries}).encode("utf-8")
+            if len(header) == size:
+                break
+        with open(self.path, "wb") as f:
+            f.write(conv.BINARY_PREFIX.pack(conv.BINARY_MAGIC, len(header)) + header + b"".join(bodies))
+
+        project, root = self.open()
+        self.assertEqual(read_tree(root, project), {"a.goon": "café", "f": {"b.goon": "plain"}})
+
+    def test_journal_replay(self):
+        conv.save_tree_to_binary(self.path, make_tree(SPEC))
+        project, root = self.open()
+        note = self.find(root, "a.goon")
+        project.read_content(note)
+        note.content = "edited"
+        note.name = "renamed.goon"
+        project.mark_dirty(note)
+        added = TreeNode("new.goon", is_folder=False, content="new text")
+        self.find(root, "folder").add_child(added)
+        project.mark_dirty(added)
+        # Same text as an existing blob, so the record refers to it
+        copy = self.find(root, "folder/copy.goon")
+        copy.content = "second \U0001F600 note"
+        project.mark_dirty(copy)
+        removed = self.find(root, "folder/inner")
+        removed.parent.remove_child(removed)
+        project.mark_removed(removed)
+        project.save(root)
+
+        project, root = self.reopen(project)
+        self.assertEqual(read_tree(root, project), {
+            "renamed.goon": "edited",
+            "empty.goon": "",
+            "folder": {"b.goon": "second \U0001F600 note", "copy.goon": "second \U0001F600 note",
+                       "new.goon": "new text"},
+        })
+
+    def test_torn_tail_is_dropped(self):
+        conv.save_tree_to_binary(self.path, make_tree(SPEC))
+        project, root = self.open()
+        note = self.find(root, "a.goon")
+        note.content = "saved"
+        project.mark_dirty(note)
+        project.save(root)
+        size = os.path.getsize(self.path)
+
+        # A batch without its commit record, then half a record header
+        note.content = "never committed"
+        project.mark_dirty(note)
+        project._append(project._records(root, project.dirty, [])[:-1])
+        with open(self.path, "ab") as f:
+            f.write(conv.JOURNAL_MAGIC + b"\x01")
+
+        project, root = self.reopen(project)
+        self.assertEqual(project.read_content(self.find(root, "a.goon")), "saved")
+        self.assertEqual(os.path.getsize(self.path), size)
+
+        # Later saves append after the last commit
+        note = self.find(root, "folder/b.goon")
+        note.content = "after truncation"
+        project.mark_dirty(note)
+        project.save(root)
+        project, root = self.reopen(project)
+        self.assertEqual(project.read_content(self.find(root, "folder/b.goon")), "after truncation")
+
+    def test_compaction_keeps_saves_made_while_it_runs(self):
+        conv.save_tree_to_binary(self.path, make_tree(SPEC))
+        project, root = self.open()
+        note = self.find(root, "a.goon")
+        note.content = "before compaction"
+        project.mark_dirty(note)
+        project.save(root)
+
+        gate = threading.Event()
+        compact = project._compact
+
+        def held_compact(snapshot, temp_path):
+            gate.wait()
+            compact(snapshot, temp_path)
+
+        project._compact = held_compact
+        project._start_compaction(root)
+        compactor = project.compactor
+
+        # Saved to the old file while the snapshot is being written
+        note = self.find(root, "folder/b.goon")
+        note.content = "during compaction"
+        project.mark_dirty(note)
+        removed = self.find(root, "folder/inner")
+        removed.parent.remove_child(removed)
+        project.mark_removed(removed)
+        project.save(root)
+
+        gate.set()
+        compactor.join()
+        self.assertIsNotNone(project.compacted)
+        # The next save swaps the compacted file in
+        project.save(root)
+        self.assertIsNone(project.compacted)
+        self.assertFalse(os.path.exists(self.path + ".compact"))
+
+        expected = {
+            "a.goon": "before compaction",
+            "empty.goon": "",
+            "folder": {"b.goon": "during compaction", "copy.goon": "first note\nwith two lines"},
+        }
+        self.assertEqual(read_tree(root, project), expected)
+        project, root = self.reopen(project)
+        self.assertEqual(read_tree(root, project), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
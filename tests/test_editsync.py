@@ -0,0 +1,56 @@
+import os
+import sys
+import tkinter as tk
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ds.editsync import EditSync
+from ds.gapbuffer import GapBuffer
+
+
+class EditSyncTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            self.root = tk.Tk()
+        except tk.TclError as e:
+            self.skipTest(f"No display: {e}")
+        self.root.withdraw()
+        self.text = tk.Text(self.root, undo=False)
+        self.buffer = GapBuffer()
+        self.sync = EditSync(self.text, self.buffer)
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def assertInSync(self):
+        self.assertEqual(self.buffer.get_text(), self.text.get("1.0", "end-1c"))
+
+    def test_columns_after_astral_characters(self):
+        self.text.insert("1.0", "a\U0001F600b\nc\U0001F600\U0001F600d")
+        self.text.insert("1.end", "X")
+        self.text.insert("2.end -1c", "Y")
+        self.text.delete("1.0", "1.0 +1c")
+        self.text.delete("2.1")
+        self.assertInSync()
+        self.assertEqual(self.text.get(self.sync.index(self.buffer.get_text_length() - 1)), "d")
+
+    def test_delete_to_end_from_line_start(self):
+        # Tk also removes the newline before "2.0" here
+        self.text.insert("1.0", "one\ntwo\nthree")
+        self.text.delete("2.0", "end")
+        self.assertInSync()
+        self.assertEqual(self.buffer.get_text(), "one")
+
+    def test_rejected_command_stays_a_tcl_error(self):
+        self.text.tk.eval(f"catch {{{self.text._w} edit undo}}")
+        self.text.tk.eval(f"catch {{{self.text._w} get sel.first sel.last}}")
+        # A pending Python error would be re-raised here
+        self.root.update()
+        with self.assertRaises(tk.TclError):
+            self.text.delete("nonsense")
+        self.assertInSync()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ds.lineindex as lineindex
+from ds.gapbuffer import GapBuffer
+
+
+class LineIndexTest(unittest.TestCase):
+    def assertLinesMatch(self, buffer, text):
+        self.assertEqual(buffer.get_text(), text)
+        newlines = [i for i, char in enumerate(text) if char == "\n"]
+        self.assertEqual(buffer.line_count(), len(newlines) + 1)
+        for line in range(1, len(newlines) + 3):
+            expected = 0 if line == 1 else newlines[line - 2] + 1 if line <= len(newlines) + 1 else len(text)
+            self.assertEqual(buffer.line_start(line), expected)
+        for offset in range(0, len(text) + 1, 7):
+            self.assertEqual(buffer.line_of(offset), sum(1 for p in newlines if p < offset) + 1)
+
+    def run_edits(self, seed):
+        rng = random.Random(seed)
+        text = "".join(rng.choice("ab\n") for _ in range(300))
+        buffer = GapBuffer()
+        buffer.set_text(text)
+        for _ in range(400):
+            position = rng.randint(0, len(text))
+            roll = rng.random()
+            if roll < 0.3:
+                inserted = "".join(rng.choice("xy\n") for _ in range(rng.randint(0, 12)))
+                buffer.insert_text(inserted, position)
+                text = text[:position] + inserted + text[position:]
+            elif roll < 0.5:
+                end = min(len(text), position + rng.randint(0, 20))
+                buffer.delete_range(position, end)
+                text = text[:position] + text[end:]
+            elif roll < 0.6:
+                buffer.move_cursor(position)
+                if buffer.delete():
+                    text = text[:position - 1] + text[position:]
+            elif roll < 0.7:
+                buffer.move_cursor(position)
+                if buffer.delete_forward():
+                    text = text[:position] + text[position + 1:]
+            elif roll < 0.8:
+                buffer = buffer.snapshot()
+            else:
+                buffer.move_cursor(position)
+            self.assertLinesMatch(buffer, text)
+
+    def test_random_edits_and_gap_moves(self):
+        for block_size in (2, 3, lineindex.BLOCK_SIZE):
+            with self.subTest(block_size=block_size):
+                saved = lineindex.BLOCK_SIZE
+                lineindex.BLOCK_SIZE = block_size
+                try:
+                    self.run_edits(block_size)
+                finally:
+                    lineindex.BLOCK_SIZE = saved
+
+
+if __name__ == "__main__":
+    unittest.main()